@@ -1,9 +1,13 @@
+import json
 import os
 import sys
-from typing import List
+import threading
+import time
+from typing import List, Optional
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from groq import Groq
@@ -14,6 +18,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 try:
     from core.sanitiser import Sanitizer
+    from core.label_profiles import profile_labels
 except ImportError as e:
     print(f"Could not import core.sanitiser: {e}")
     print("Make sure you're running from the backend/ dir and core/ is a sibling.")
@@ -33,10 +38,65 @@ if not api_key:
 
 client = Groq(api_key=api_key)
 
-# load the sanitizer (this downloads GLiNER on first run, takes a few seconds)
-print("Loading core engine...")
-sanitizer = Sanitizer()
-print("Core engine ready.")
+# long docs are fine, the sanitizer windows them for NER
+MAX_MESSAGE_CHARS = 50_000
+
+# the sanitizer loads in a background thread (GLiNER download/load + a warm-up
+# pass through every stage takes a while), so the server answers straight away.
+# /health/live = process is up, /health/ready = engine loaded AND warmed up
+sanitizer = None
+engine_ready = threading.Event()
+engine_state = {"status": "loading", "error": None, "load_seconds": None, "warmup_seconds": None}
+
+# SP_NER_BACKEND picks torch / torch_int8 / onnx / onnx_int8 (CPU boxes want one of the int8 ones),
+# or remote to use the shared pool from core/ner_service.py instead of a model per worker
+ner_backend = os.getenv("SP_NER_BACKEND", "torch")
+
+
+def load_engine():
+    global sanitizer
+    try:
+        print("Loading core engine...")
+        t0 = time.time()
+        # SP_NER_CACHE = sqlite file for the NER cache (unset = memory only, the default).
+        #   the file holds detected PII in plaintext, only set it on a trusted disk
+        # SP_INCREMENTAL_NER=1 = per-sentence NER, repeated sentences in a session skip the model
+        # SP_INTENT_CACHE = sqlite file for LLM intent answers (read by intent_classifier.py),
+        #   same deal: unset = memory only, set = plaintext entity texts on disk
+        # SP_INTENT_SOURCE = llm / model / heuristic (read by entity_classifier.py)
+        engine = Sanitizer(
+            ner_backend=ner_backend,
+            ner_cache_path=os.getenv("SP_NER_CACHE"),
+            incremental_ner=os.getenv("SP_INCREMENTAL_NER", "0") == "1",
+            # SP_LABEL_PROFILE = general / medical / legal / finance / full (unset = guess per prompt)
+            profile=os.getenv("SP_LABEL_PROFILE") or None,
+            # SP_MICROBATCH_MS = coalesce concurrent NER calls for up to this long (unset/0 = off)
+            microbatch_ms=float(os.getenv("SP_MICROBATCH_MS", "0")) or None,
+            microbatch_max=int(os.getenv("SP_MICROBATCH_MAX", "16")),
+        )
+        engine_state["load_seconds"] = round(time.time() - t0, 2)
+
+        engine_state["status"] = "warming_up"
+        engine_state["warmup_seconds"] = round(engine.warmup(), 2)
+
+        sanitizer = engine
+        engine_state["status"] = "ready"
+        engine_ready.set()
+        print(f"Core engine ready (load {engine_state['load_seconds']}s, warm-up {engine_state['warmup_seconds']}s).")
+    except Exception as e:
+        engine_state["status"] = "failed"
+        engine_state["error"] = str(e)
+        print(f"ERROR loading core engine: {e}")
+
+
+def require_engine():
+    """the sanitizer, or a 503 while it's still loading"""
+    if not engine_ready.is_set():
+        raise HTTPException(status_code=503, detail=f"Core engine not ready ({engine_state['status']})")
+    return sanitizer
+
+
+threading.Thread(target=load_engine, name="engine-loader", daemon=True).start()
 
 # conversation history for multi-turn context
 conversation_history: list[dict] = []
@@ -97,6 +157,11 @@ app.add_middleware(
 
 class ChatRequest(BaseModel):
     message: str
+    strict: Optional[bool] = None  # True = always run NER, never take the fast path
+    profile: Optional[str] = None  # label profile just for this message
+
+class ProfileRequest(BaseModel):
+    profile: Optional[str] = None  # None = back to auto
 
 class EntityInfo(BaseModel):
     text: str
@@ -104,6 +169,11 @@ class EntityInfo(BaseModel):
     alias: str
     tier: str
     score: float
+    # where it is in the message / in sanitized_prompt, for highlighting
+    start: Optional[int] = None
+    end: Optional[int] = None
+    sanitized_start: Optional[int] = None
+    sanitized_end: Optional[int] = None
 
 class PrivacyScore(BaseModel):
     score: int
@@ -120,6 +190,7 @@ class ChatResponse(BaseModel):
     sanitized_prompt: str
     entities_detected: List[EntityInfo]
     privacy_score: PrivacyScore
+    ner_skipped: bool = False
     silent_mode: bool = True
 
 
@@ -127,30 +198,87 @@ class ChatResponse(BaseModel):
 
 @app.get("/health")
 def health_check():
+    ready = engine_ready.is_set()
     return {
         "status": "ok",
         "version": "2.1.0",
-        "core_loaded": True,
+        "core_loaded": ready,
+        "engine": engine_state,
         "model_name": "gliner_medium-v2.1",
+        "ner_backend": ner_backend,
         "groq_configured": bool(api_key),
         "conversation_turns": len(conversation_history),
+        "ner_cache": sanitizer.cache_stats() if ready else None,
+        "microbatch": sanitizer.batcher_stats() if ready else None,
+        "intent_llm": sanitizer.intent_stats() if ready else None,
     }
 
 
+@app.get("/health/live")
+def liveness():
+    """process is up and serving - says nothing about the model"""
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+def readiness():
+    """200 only once the engine is loaded and warmed up, load balancers route on this"""
+    if not engine_ready.is_set():
+        return JSONResponse(status_code=503, content={"status": engine_state["status"], "error": engine_state["error"]})
+    return {"status": "ready", "load_seconds": engine_state["load_seconds"],
+            "warmup_seconds": engine_state["warmup_seconds"]}
+
+
 @app.get("/aliases")
 def get_aliases():
-    mapping = sanitizer.get_alias_map()
+    mapping = require_engine().get_alias_map()
     return {"aliases": mapping, "total": len(mapping)}
 
 
 @app.post("/reset")
 def reset_session():
     global conversation_history
-    sanitizer.clear()
+    require_engine().clear()
     conversation_history = []
     return {"status": "reset", "message": "Session cleared."}
 
 
+@app.post("/profile")
+def set_profile(request: ProfileRequest):
+    """pin the NER label profile for this session"""
+    engine = require_engine()
+    try:
+        engine.set_profile(request.profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "ok", "profile": request.profile or "auto"}
+
+
+def check_profile(profile):
+    """400 for a label profile that doesn't exist, before any work is done"""
+    if profile is None:
+        return
+    try:
+        profile_labels(profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def entity_info(e, alias_map, spans=True):
+    # spans=False when the injection filter cut the sanitized text, positions are off then
+    return EntityInfo(
+        text=e["text"],
+        label=e["label"],
+        alias=alias_map.get(e["text"], e["text"]),
+        tier=e.get("tier", "UNKNOWN"),
+        score=e.get("score", 1.0),
+        start=e.get("start"),
+        end=e.get("end"),
+        sanitized_start=e.get("sanitized_start") if spans else None,
+        sanitized_end=e.get("sanitized_end") if spans else None,
+    )
+
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
@@ -160,15 +288,20 @@ async def chat(request: ChatRequest):
     3. De-sanitize LLM response (put real names back)
     4. Return everything for the frontend to display
     """
+    engine = require_engine()
+    check_profile(request.profile)
     try:
         # basic input validation
         if not request.message or not request.message.strip():
             raise HTTPException(status_code=400, detail="Empty message")
-        if len(request.message) > 5000:
-            raise HTTPException(status_code=413, detail="Message too long (max 5000 chars)")
+        if len(request.message) > MAX_MESSAGE_CHARS:
+            raise HTTPException(status_code=413, detail=f"Message too long (max {MAX_MESSAGE_CHARS} chars)")
 
-        # sanitize
-        sanitized_text, entities, alias_map, score_dict = sanitizer.sanitize_prompt(request.message)
+        # sanitize - NER runs off the event loop (so concurrent requests can share a
+        # NER batch), the ollama intent call is awaited so it doesn't hold a thread
+        sanitized_text, entities, alias_map, score_dict = await engine.asanitize_prompt(
+            request.message, strict=request.strict, profile=request.profile
+        )
 
         # check for prompt injection in the sanitized text
         is_injection, matched = check_injection(sanitized_text)
@@ -206,19 +339,10 @@ async def chat(request: ChatRequest):
         conversation_history.append({"role": "assistant", "content": llm_response})
 
         # de-sanitize (swap fakes back to real names in the response)
-        restored = sanitizer.desanitize_response(llm_response)
+        restored = engine.desanitize_response(llm_response)
 
         # build response
-        entity_infos = []
-        for e in entities:
-            used_alias = alias_map.get(e["text"], e["text"])
-            entity_infos.append(EntityInfo(
-                text=e["text"],
-                label=e["label"],
-                alias=used_alias,
-                tier=e.get("tier", "UNKNOWN"),
-                score=e.get("score", 1.0)
-            ))
+        entity_infos = [entity_info(e, alias_map, spans=not is_injection) for e in entities]
 
         privacy_data = PrivacyScore(**score_dict)
 
@@ -227,14 +351,90 @@ async def chat(request: ChatRequest):
             sanitized_prompt=sanitized_text,
             entities_detected=entity_infos,
             privacy_score=privacy_data,
+            ner_skipped=score_dict.get("ner_skipped", False),
             silent_mode=True
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in /chat: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Same pipeline as /chat but the answer streams back as it's generated.
+    NDJSON, one object per line:
+      {"sanitized_prompt", "entities_detected", "privacy_score", "ner_skipped"}  first
+      {"delta": "..."}  restored text as it comes in (fakes already swapped back)
+      {"done": true}    last
+    """
+    engine = require_engine()
+    check_profile(request.profile)
+    if not request.message or not request.message.strip():
+        raise HTTPException(status_code=400, detail="Empty message")
+    if len(request.message) > MAX_MESSAGE_CHARS:
+        raise HTTPException(status_code=413, detail=f"Message too long (max {MAX_MESSAGE_CHARS} chars)")
+
+    sanitized_text, entities, alias_map, score_dict = await engine.asanitize_prompt(
+        request.message, strict=request.strict, profile=request.profile
+    )
+    is_injection, matched = check_injection(sanitized_text)
+    if is_injection:
+        print(f"WARNING: injection attempt detected: {matched}")
+        for pattern in INJECTION_PATTERNS:
+            sanitized_text = pattern.sub('', sanitized_text).strip()
+
+    conversation_history.append({"role": "user", "content": sanitized_text})
+    if len(conversation_history) > 20:
+        conversation_history[:] = conversation_history[-20:]
+    messages_to_send = [SYSTEM_PROMPT] + conversation_history
+
+    meta = {
+        "sanitized_prompt": sanitized_text,
+        "entities_detected": [entity_info(e, alias_map, spans=not is_injection).model_dump() for e in entities],
+        "privacy_score": PrivacyScore(**score_dict).model_dump(),
+        "ner_skipped": score_dict.get("ner_skipped", False),
+    }
+
+    def events():
+        yield json.dumps(meta) + "\n"
+        # a fake split over two chunks ("James Jo" + "nes") is held back
+        # until it's complete, so the client only ever sees real names
+        restorer = engine.desanitize_stream()
+        parts = []
+        try:
+            stream = client.chat.completions.create(
+                model="llama-3.3-70b-versatile",
+                messages=messages_to_send,
+                temperature=0.7,
+                max_tokens=1024,
+                stream=True,
+            )
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                parts.append(delta)
+                restored = restorer.feed(delta)
+                if restored:
+                    yield json.dumps({"delta": restored}) + "\n"
+        except Exception as e:
+            print(f"ERROR TALKING TO GROQ: {e}")
+            error = " Sorry, hit an error connecting to Groq. " + str(e)
+            parts.append(error)
+            yield json.dumps({"delta": restorer.feed(error)}) + "\n"
+        rest = restorer.flush()
+        if rest:
+            yield json.dumps({"delta": rest}) + "\n"
+        conversation_history.append({"role": "assistant", "content": "".join(parts)})
+        yield json.dumps({"done": True}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 if __name__ == "__main__":
     import uvicorn
     print()
@@ -30,6 +30,21 @@ def print_header(title):
     print(f"{C_CYAN}{C_BOLD}  {title}{C_RESET}")
     print(f"{C_CYAN}{C_BOLD}{'='*80}{C_RESET}")
 
+def wait_for_engine(timeout=300):
+    """the backend loads the model in the background, wait until /health/ready says so"""
+    print("Waiting for core engine to load + warm up...")
+    start = time.time()
+    while time.time() - start < timeout:
+        ready = client.get("/health/ready")
+        if ready.status_code == 200:
+            print(f"{C_GREEN}Engine ready{C_RESET} ({ready.json()})")
+            return True
+        if ready.json().get("status") == "failed":
+            break
+        time.sleep(0.5)
+    print(f"{C_RED}Engine did not become ready:{C_RESET} {client.get('/health').json().get('engine')}")
+    sys.exit(1)
+
 def run_prompt_test(test_id, name_or_scenario, prompt_text, expected_behavior="", wait_time=0.5):
     """send a prompt to the backend and print results"""
     # Reset session before each independent test
@@ -120,6 +135,7 @@ def run_all_tests():
     print_header("CLI TESTS COMPLETE")
 
 if __name__ == "__main__":
+    wait_for_engine()
     if len(sys.argv) > 1 and sys.argv[1] == "interactive":
         print_header("Silent-Protocol Interactive Dev Env")
         client.post("/reset")
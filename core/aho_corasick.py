@@ -0,0 +1,171 @@
+"""
+aho_corasick.py - find lots of fixed strings in one pass over a text
+
+a plain Aho-Corasick automaton: all the keys go into a trie, failure
+links let the scan fall back to the longest suffix that's still a
+prefix of some key, so the text is walked once no matter how many keys
+there are (50k names costs about the same per char as 50).
+
+keys are matched case-insensitively unless ignore_case=False. the
+tables are plain lists / dicts, so a built automaton pickles fine.
+
+longest_at() / is_prefix() only walk the trie, so they need no build()
+and see keys the moment they're added - alias_manager.py keeps its fakes
+in one of these and adds to it as new aliases get made.
+"""
+
+
+class AhoCorasick:
+
+    def __init__(self, ignore_case: bool = True):
+        self.ignore_case = ignore_case
+        self._goto = [{}]       # node -> {char: next node}
+        self._fail = [0]        # node -> node to fall back to
+        self._depth = [0]       # node -> length of the prefix it stands for
+        self._values = {}       # node -> value, for nodes where a key ends
+        self._out = [()]        # node -> ((length, value), ...) every key ending here, filled by build()
+        self._built = True
+
+    def __len__(self):
+        return len(self._values)
+
+    def add(self, key: str, value=None):
+        """add a key, value defaults to the key. adding a key twice replaces its value"""
+        if not key:
+            raise ValueError("empty key")
+        if self.ignore_case:
+            key = key.lower()
+        node = 0
+        for ch in key:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._depth.append(self._depth[node] + 1)
+                self._out.append(())
+                self._goto[node][ch] = nxt
+            node = nxt
+        self._values[node] = key if value is None else value
+        self._built = False
+
+    def build(self):
+        """wire up the failure links, call after the last add()"""
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = []
+        for child in goto[0].values():
+            fail[child] = 0
+            queue.append(child)
+
+        # breadth first, so a node's fail target is always done before the node
+        for node in queue:
+            for ch, child in goto[node].items():
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[child] = goto[f].get(ch, 0)
+                queue.append(child)
+
+        for node in [0] + queue:
+            own = ((self._depth[node], self._values[node]),) if node in self._values else ()
+            out[node] = own + out[fail[node]] if node else own
+        self._built = True
+
+    def get(self, key: str, default=None):
+        """exact lookup of a whole key"""
+        if self.ignore_case:
+            key = key.lower()
+        node = 0
+        for ch in key:
+            node = self._goto[node].get(ch)
+            if node is None:
+                return default
+        return self._values.get(node, default)
+
+    def longest_at(self, text: str, start: int, whole_words: bool = True):
+        """
+        (end, value) for the longest key that starts exactly at text[start],
+        None if none does. whole_words like find()
+        """
+        goto, values = self._goto, self._values
+        node = 0
+        best = None
+        for end in range(start, len(text)):
+            ch = text[end]
+            if self.ignore_case:
+                low = ch.lower()
+                ch = low if len(low) == 1 else ch
+            node = goto[node].get(ch)
+            if node is None:
+                break
+            if node in values and (not whole_words or _on_word_boundary(text, start, end + 1)):
+                best = (end + 1, values[node])
+        return best
+
+    def is_prefix(self, text: str, start: int, end: int | None = None) -> bool:
+        """True if text[start:end] is the beginning of some key (or a whole key)"""
+        goto = self._goto
+        node = 0
+        for ch in text[start:end]:
+            if self.ignore_case:
+                low = ch.lower()
+                ch = low if len(low) == 1 else ch
+            node = goto[node].get(ch)
+            if node is None:
+                return False
+        return True
+
+    def iter(self, text: str):
+        """every (start, end, value) occurrence in text, overlaps included, in order of end"""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(self._fold(text)):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, value in out[node]:
+                yield i + 1 - length, i + 1, value
+
+    def find(self, text: str, whole_words: bool = True) -> list[tuple]:
+        """
+        non-overlapping (start, end, value) matches, leftmost first and
+        the longest key at that spot. whole_words drops hits that start
+        or end in the middle of a word ("rome" inside "chromecast")
+        """
+        hits = []
+        for start, end, value in self.iter(text):
+            if whole_words and not _on_word_boundary(text, start, end):
+                continue
+            hits.append((start, end, value))
+
+        hits.sort(key=lambda h: (h[0], h[0] - h[1]))
+        matches = []
+        last_end = 0
+        for hit in hits:
+            if hit[0] >= last_end:
+                matches.append(hit)
+                last_end = hit[1]
+        return matches
+
+    def _fold(self, text):
+        if not self.ignore_case:
+            return text
+        folded = text.lower()
+        if len(folded) == len(text):
+            return folded
+        # a few chars lowercase to two ("İ"), keep those as-is so offsets stay put
+        return "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+def _on_word_boundary(text, start, end):
+    if start > 0 and _is_word_char(text[start - 1]) and _is_word_char(text[start]):
+        return False
+    if end < len(text) and _is_word_char(text[end]) and _is_word_char(text[end - 1]):
+        return False
+    return True
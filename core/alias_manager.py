@@ -4,21 +4,44 @@ alias_manager.py - handles all the fake data generation
 REPLACE = full swap (names, emails, etc)
 PERTURB = small noise (dates, money)
 PRESERVE = dont touch
+
+desanitize walks the response once: the fakes sit in a trie (aho_corasick.py)
+that grows as aliases are made, and only spots where a fake could start
+get looked at. optional: case-insensitive matches, surname-only mentions
+of people ("Mr. Carter" for "James Carter"), possessives ("Jones'" -> "Cook's")
+
+sanitize_with_map also hands back an OffsetMap, original <-> sanitized
+positions, for highlighting entities in the sanitized text
 """
 
+from bisect import bisect_right
 from faker import Faker
 import random
 import re
 from dateutil import parser as dateutil_parser
 from datetime import timedelta
 
+try:
+    from .aho_corasick import AhoCorasick
+except ImportError:
+    from aho_corasick import AhoCorasick
+
 
 class AliasManager:
-    def __init__(self):
+    def __init__(self, ignore_case: bool = False, partial_names: bool = False,
+                 possessives: bool = True):
         self.real_to_fake = {}
         self.fake_to_real = {}
         self.fake = Faker()
 
+        # desanitize defaults, each can be overridden per call
+        self.ignore_case = ignore_case
+        self.partial_names = partial_names
+        self.possessives = possessives
+        # fake surname -> real surname, None when two people share a fake surname
+        self._surnames = {}
+        self._indexes = {}  # (ignore_case, "alias" / "surname") -> _FakeIndex, made on first use
+
         self._corp_suffixes = [
             "Corp", "Technologies", "Systems", "Industries",
             "Group", "Solutions", "Labs", "Dynamics",
@@ -66,28 +89,146 @@ class AliasManager:
         self.real_to_fake[entity_text] = alias
         if tier != "PERTURB":
             self.fake_to_real[alias] = entity_text
+            self._index_alias(alias, entity_text, label)
         return alias
 
     def sanitize_by_offsets(self, text, classified_entities):
-        """replace entities right-to-left so positions dont shift"""
+        """swap every entity that isn't PRESERVE for its alias"""
+        return self.sanitize_with_map(text, classified_entities)[0]
+
+    def sanitize_with_map(self, text, classified_entities):
+        """
+        sanitize_by_offsets + an OffsetMap of where everything ended up.
+        one pass left to right, the output is joined from segments at the end.
+        an entity inside one already replaced is skipped, one that sticks out
+        past it gets the part that sticks out aliased on its own - classify
+        keeps entities that overlap by up to half, and that part mustn't go
+        out as the real text
+        """
         to_replace = [e for e in classified_entities if e.get("tier") != "PRESERVE"]
-        to_replace.sort(key=lambda e: e["start"], reverse=True)
+        to_replace.sort(key=lambda e: (e["start"], -e["end"]))
 
+        out = []
+        spans = []
+        last = 0
+        length = 0  # of the output so far
         for entity in to_replace:
-            alias = self.get_or_create(
-                entity["text"], entity["label"], entity.get("tier", "REPLACE")
-            )
-            text = text[:entity["start"]] + alias + text[entity["end"]:]
-
-        return text
-
-    def desanitize(self, text):
-        """swap fake names back to real in the response"""
-        for fake, real in sorted(
-            self.fake_to_real.items(), key=lambda x: len(x[0]), reverse=True
-        ):
-            text = text.replace(fake, real)
-        return text
+            start, end = entity["start"], entity["end"]
+            real = entity["text"]
+            span_start = start
+            if start < last:
+                span_start = last  # map span runs on from the one before it
+                if end <= last:
+                    continue
+                # partial overlap: "...@infosys.com Sharma Priya" -> alias "Sharma Priya"
+                rest = text[last:end]
+                start = last + len(rest) - len(rest.lstrip())
+                end = start + len(rest.strip())
+                real = text[start:end]
+                if not real:
+                    continue
+            alias = self.get_or_create(real, entity["label"], entity.get("tier", "REPLACE"))
+            out.append(text[last:start])
+            out.append(alias)
+            san_start = length + span_start - last
+            length += start - last + len(alias)
+            spans.append((span_start, end, san_start, length))
+            last = end
+        out.append(text[last:])
+        return "".join(out), OffsetMap(spans)
+
+    def desanitize(self, text, ignore_case: bool | None = None, partial_names: bool | None = None,
+                   possessives: bool | None = None):
+        """
+        swap fake names back to real in the response, one pass, longest fake
+        wins where several start at the same spot. whole words only, so
+        the fake "Kim" doesn't touch "Kimberly"
+        """
+        if not self.fake_to_real or not text:
+            return text
+        return self._restore(text, 0, len(text), *self._options(ignore_case, partial_names, possessives))[0]
+
+    def stream(self, ignore_case: bool | None = None, partial_names: bool | None = None,
+               possessives: bool | None = None):
+        """a StreamingDesanitizer for one response that comes in chunks"""
+        return StreamingDesanitizer(self, ignore_case, partial_names, possessives)
+
+    def _options(self, ignore_case, partial_names, possessives):
+        return (
+            self.ignore_case if ignore_case is None else ignore_case,
+            self.partial_names if partial_names is None else partial_names,
+            self.possessives if possessives is None else possessives,
+        )
+
+    def _restore(self, text, pos, stop, ignore_case, partial_names, possessives):
+        """
+        restore the fakes that start in text[pos:stop], text before pos is
+        only there for word boundaries. returns (restored text[pos:end], end),
+        end is past stop when a fake runs over it
+        """
+        aliases = self._index(ignore_case, "alias")
+        surnames = self._index(ignore_case, "surname") if partial_names and self._surnames else None
+
+        out = []
+        last = pos
+        while True:
+            start = aliases.next_start(text, pos, surnames)
+            if start == -1 or start >= stop:
+                break
+            hit = aliases.trie.longest_at(text, start)
+            if hit is not None:
+                end, fake = hit
+                real = self.fake_to_real.get(fake)
+            elif surnames is not None and (hit := surnames.trie.longest_at(text, start)) is not None:
+                end, fake = hit
+                real = self._surnames.get(fake)
+            else:
+                real = None
+            if real is None:
+                pos = start + 1
+                continue
+
+            matched = text[start:end]
+            if ignore_case and matched != fake:
+                real = _match_case(matched, real)
+            out.append(text[last:start])
+            out.append(real)
+            last = pos = end
+
+            # "Jones' car" -> "Cook's car", not "Cook' car"
+            if (possessives and fake[-1:] in "sS" and real[-1:] not in "sS"
+                    and text[end:end + 1] in _APOSTROPHES and not _is_word_char(text[end + 1:end + 2])):
+                out.append(text[end] + "s")
+                last = pos = end + 1
+        end = max(last, stop)
+        out.append(text[last:end])
+        return "".join(out), end
+
+    def _index_alias(self, alias, real, label):
+        if label.lower() == "person":
+            fake_last, real_last = _surname(alias), _surname(real)
+            if fake_last and real_last and fake_last != alias:
+                if fake_last not in self._surnames:
+                    for (_, kind), index in self._indexes.items():
+                        if kind == "surname":
+                            index.add(fake_last)
+                elif self._surnames[fake_last] != real_last:
+                    real_last = None  # two people, one fake surname: can't tell them apart
+                self._surnames[fake_last] = real_last
+        for (_, kind), index in self._indexes.items():
+            if kind == "alias":
+                index.add(alias)
+
+    def _index(self, ignore_case, kind):
+        """the trie for this kind of key, (re)filled if fake_to_real was changed by hand"""
+        keys = self.fake_to_real if kind == "alias" else self._surnames
+        index = self._indexes.get((ignore_case, kind))
+        if index is None or index.added != len(keys):
+            index = _FakeIndex(ignore_case)
+            for key in keys:
+                index.add(key)
+            self._indexes[(ignore_case, kind)] = index
+        return index
 
     def get_mapping(self):
         return dict(self.real_to_fake)
@@ -95,6 +236,8 @@ class AliasManager:
     def clear(self):
         self.real_to_fake = {}
         self.fake_to_real = {}
+        self._surnames = {}
+        self._indexes = {}
 
     # --- name generation (culturally + gender aware) ---
 
@@ -403,4 +546,205 @@ class AliasManager:
         new_pct = round(pct * random.uniform(0.85, 1.15), 1)
         if "." not in num_match.group():
             new_pct = int(round(new_pct))
-        return original.replace(num_match.group(), str(new_pct))
\ No newline at end of file
+        return original.replace(num_match.group(), str(new_pct))
+
+
+class _FakeIndex:
+    """
+    fakes in a trie, plus a regex that jumps to the next place one could
+    start (a word start with the first two chars of some fake). adding a
+    fake is a trie insert, the regex is only redone when a new two-char
+    prefix shows up - after the first few aliases that's rare
+    """
+
+    def __init__(self, ignore_case):
+        self.trie = AhoCorasick(ignore_case=ignore_case)
+        self.ignore_case = ignore_case
+        self.added = 0  # keys added, compared with the dict it mirrors
+        self.longest = 0
+        self._prefixes = set()
+        self._starts = None
+
+    def add(self, key):
+        self.trie.add(key, key)
+        self.added += 1
+        self.longest = max(self.longest, len(key))
+        prefix = key[:2].lower() if self.ignore_case else key[:2]
+        if prefix not in self._prefixes:
+            self._prefixes.add(prefix)
+            self._starts = None
+
+    def next_start(self, text, pos, other=None):
+        """first position >= pos where a key of this index (or other's) could start, -1 if none"""
+        found = self._start_re().search(text, pos)
+        start = found.start() if found else -1
+        if other is not None:
+            found = other._start_re().search(text, pos)
+            if found and (start == -1 or found.start() < start):
+                start = found.start()
+        return start
+
+    def _start_re(self):
+        if self._starts is None:
+            by_first = {}
+            for prefix in self._prefixes:
+                by_first.setdefault(prefix[0], set()).add(prefix[1:])
+            parts = []
+            for first, seconds in sorted(by_first.items()):
+                # first char, then "the char before it isn't a word char" - the
+                # branches all start with a literal, which lets re skip ahead fast
+                part = re.escape(first) + (r"(?<!\w.)" if _is_word_char(first) else "")
+                if "" not in seconds:  # a one-char fake starts with anything after it
+                    part += "[" + "".join(re.escape(c) for c in sorted(seconds)) + "]"
+                parts.append(part)
+            self._starts = re.compile("|".join(parts) or r"(?!)", re.I if self.ignore_case else 0)
+        return self._starts
+
+
+class OffsetMap:
+    """
+    original <-> sanitized positions after sanitize_with_map. only the
+    replaced spans are kept, (orig_start, orig_end, san_start, san_end),
+    text between them just moves by a fixed amount. a position inside a
+    replaced span maps to the start of the other side's span, the end of
+    a span (span_to_*) to its end
+    """
+
+    def __init__(self, spans=()):
+        self.spans = [tuple(span) for span in spans]
+        self._starts = ([span[0] for span in self.spans], [span[2] for span in self.spans])
+
+    @classmethod
+    def from_entities(cls, entities):
+        """rebuild from entities carrying sanitized_start / sanitized_end (Sanitizer adds them)"""
+        spans = []
+        for e in sorted(entities, key=lambda e: (e.get("start", 0), -e.get("end", 0))):
+            if e.get("tier") == "PRESERVE" or "sanitized_start" not in e:
+                continue
+            if spans and e["start"] < spans[-1][1]:
+                if e["end"] > spans[-1][1]:
+                    # partly overlapped, the part past the previous span got its own alias
+                    spans.append((spans[-1][1], e["end"], spans[-1][3], e["sanitized_end"]))
+                continue
+            spans.append((e["start"], e["end"], e["sanitized_start"], e["sanitized_end"]))
+        return cls(spans)
+
+    def to_sanitized(self, pos: int) -> int:
+        return self._map(pos, 0)
+
+    def to_original(self, pos: int) -> int:
+        return self._map(pos, 1)
+
+    def span_to_sanitized(self, start: int, end: int) -> tuple[int, int]:
+        return self._map(start, 0), self._map(end, 0, is_end=True)
+
+    def span_to_original(self, start: int, end: int) -> tuple[int, int]:
+        return self._map(start, 1), self._map(end, 1, is_end=True)
+
+    def to_list(self) -> list[list[int]]:
+        return [list(span) for span in self.spans]
+
+    def _map(self, pos, side, is_end=False):
+        i = bisect_right(self._starts[side], pos) - 1
+        if i < 0:
+            return pos
+        span = self.spans[i]
+        src = span[2 * side:2 * side + 2]
+        dst = span[2 - 2 * side:4 - 2 * side]
+        if pos >= src[1]:
+            return pos - src[1] + dst[1]
+        return dst[1] if is_end and pos > src[0] else dst[0]
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __repr__(self):
+        return f"OffsetMap({self.spans})"
+
+
+class StreamingDesanitizer:
+    """
+    desanitize for a response that arrives in chunks (an LLM token stream).
+    feed() hands back everything that's settled so far and holds on to the
+    shortest tail that could still turn into a fake, so a fake split across
+    chunks is still restored. flush() at the end returns the rest.
+    same options as AliasManager.desanitize
+    """
+
+    def __init__(self, aliases: AliasManager, ignore_case: bool | None = None,
+                 partial_names: bool | None = None, possessives: bool | None = None):
+        self.aliases = aliases
+        self.options = aliases._options(ignore_case, partial_names, possessives)
+        # the last char already sent (for word boundaries) + what hasn't been sent
+        self._buffer = ""
+        self._sent = 0  # leading chars of _buffer that already went out
+
+    def feed(self, chunk: str) -> str:
+        if not chunk:
+            return ""
+        self._buffer += chunk
+        return self._emit(self._holdback())
+
+    def flush(self) -> str:
+        return self._emit(len(self._buffer))
+
+    def _emit(self, stop):
+        if stop <= self._sent:
+            return ""
+        if self.aliases.fake_to_real:
+            out, end = self.aliases._restore(self._buffer, self._sent, stop, *self.options)
+        else:
+            out, end = self._buffer[self._sent:stop], stop
+        keep = max(end - 1, 0)
+        self._buffer = self._buffer[keep:]
+        self._sent = end - keep
+        return out
+
+    def _holdback(self):
+        """where the tail that could still become a fake starts, len(buffer) if there's none"""
+        text = self._buffer
+        if not self.aliases.fake_to_real:
+            return len(text)
+        ignore_case, partial_names, _ = self.options
+        indexes = [self.aliases._index(ignore_case, "alias")]
+        if partial_names and self.aliases._surnames:
+            indexes.append(self.aliases._index(ignore_case, "surname"))
+
+        end = len(text)
+        if self.options[2] and text[-1:] in _APOSTROPHES:
+            end -= 1  # "Jones'" - the next char decides whether it becomes "Cook's"
+        # nothing further back than the longest fake can still be growing
+        lo = max(self._sent, end - max(index.longest for index in indexes))
+        for start in range(lo, end):
+            if start and _is_word_char(text[start - 1]) and _is_word_char(text[start]):
+                continue  # middle of a word, no fake starts here
+            if any(index.trie.is_prefix(text, start, end) for index in indexes):
+                return start
+        return len(text)
+
+
+_APOSTROPHES = ("'", "\u2019")
+
+_TITLES = re.compile(r'^(Dr\.?|Mr\.?|Mrs\.?|Ms\.?|Prof\.?)\s+', re.IGNORECASE)
+
+
+def _surname(name):
+    """last word of a person's name, None if there isn't a usable one"""
+    parts = _TITLES.sub("", name).split()
+    if not parts:
+        return None
+    last = parts[-1].strip(",.")
+    return last if len(last) >= 3 and last[0].isalpha() else None
+
+
+def _match_case(matched, real):
+    """follow how the LLM cased the fake: SHOUTING / lowercase / as-is"""
+    if matched.isupper():
+        return real.upper()
+    if matched.islower():
+        return real.lower()
+    return real
+
+
+def _is_word_char(ch):
+    return bool(ch) and (ch.isalnum() or ch == "_")
@@ -0,0 +1,90 @@
+"""
+compares the NER backends (torch / torch_int8 / onnx / onnx_int8)
+on the 40 prompts in real_prompts.json
+
+for every backend: latency per prompt, and how many of the torch
+baseline's entities it still finds (same text span + same label)
+
+run: python bench_backends.py                 # all backends
+     python bench_backends.py torch onnx_int8  # just these
+"""
+
+import json, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.ner_backend import BACKENDS, MODEL_ID, load_ner_model
+from core.sanitiser import Sanitizer
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "real_prompts.json")
+
+THRESHOLD = Sanitizer.THRESHOLD
+WARMUP = 3
+
+
+def spans(entities):
+    return {(e["start"], e["end"], e["label"]) for e in entities}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(backends):
+    with open(DATA) as f:
+        prompts = [p["prompt"] for p in json.load(f)["prompts"]]
+
+    labels = Sanitizer.LABELS
+
+    baseline = None
+    rows = []
+
+    # torch always goes first, everything else is compared against it
+    for backend in ["torch"] + [b for b in backends if b != "torch"]:
+        print(f"\nloading {backend}...")
+        t0 = time.time()
+        model = load_ner_model(backend, MODEL_ID)
+        load_time = time.time() - t0
+
+        for p in prompts[:WARMUP]:
+            model.predict_entities(p, labels, threshold=THRESHOLD)
+
+        results, times = [], []
+        for p in prompts:
+            t1 = time.time()
+            results.append(model.predict_entities(p, labels, threshold=THRESHOLD))
+            times.append((time.time() - t1) * 1000)
+
+        if baseline is None:
+            baseline = results
+
+        # agreement = F1 between this backend's spans and torch's
+        tp = fp = fn = 0
+        for ours, ref in zip(results, baseline):
+            a, b = spans(ours), spans(ref)
+            tp += len(a & b)
+            fp += len(a - b)
+            fn += len(b - a)
+        precision = tp / max(tp + fp, 1)
+        recall = tp / max(tp + fn, 1)
+        f1 = 2 * precision * recall / max(precision + recall, 1e-9)
+
+        rows.append((backend, load_time, sum(times) / len(times),
+                     percentile(times, 50), percentile(times, 95), recall, f1))
+        del model
+
+    print(f"\n{'backend':12s} {'load s':>7s} {'mean ms':>8s} {'p50 ms':>7s} {'p95 ms':>7s} {'recall':>7s} {'F1':>6s}")
+    print("-" * 60)
+    for backend, load_time, mean, p50, p95, recall, f1 in rows:
+        print(f"{backend:12s} {load_time:7.1f} {mean:8.1f} {p50:7.1f} {p95:7.1f} {recall:7.1%} {f1:6.1%}")
+    print(f"\n{len(prompts)} prompts, recall/F1 are vs the torch baseline")
+
+
+if __name__ == "__main__":
+    # remote needs ner_service.py running, only bench it when asked for
+    wanted = sys.argv[1:] or [b for b in BACKENDS if b != "remote"]
+    bad = [b for b in wanted if b not in BACKENDS]
+    if bad:
+        print(f"unknown backend(s): {bad}, pick from {BACKENDS}")
+        sys.exit(1)
+    run(wanted)
@@ -0,0 +1,44 @@
+"""
+micro-benchmark: classify dedup with interval lookups vs the old set-of-positions version
+
+builds documents with thousands of overlapping entities (the kind you
+get from long pasted docs: regex + NER hits on the same names) and times
+the dedup on both
+
+run: python bench_dedup.py
+"""
+
+import os, random, sys, timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.entity_classifier import EntityClassifier
+from core.test_entity_dedup import legacy_dedup, random_entities
+
+# span lengths to draw from - names, emails, urls, whole addresses
+SPAN_LENGTHS = [3, 5, 8, 12, 20, 40, 80, 150]
+
+# (entities, doc chars)
+SIZES = [(500, 10_000), (2_000, 50_000), (5_000, 100_000), (10_000, 250_000)]
+REPEAT = 3
+
+
+def best_ms(fn):
+    return min(timeit.repeat(fn, number=1, repeat=REPEAT)) * 1000
+
+
+def run():
+    rng = random.Random(3)
+    classifier = EntityClassifier()
+
+    print(f"{'entities':>9s} {'chars':>8s} {'old ms':>9s} {'new ms':>9s} {'speedup':>8s} {'kept':>6s}")
+    print("-" * 56)
+    for n, doc_len in SIZES:
+        entities = random_entities(rng, n, doc_len, SPAN_LENGTHS)
+        old_ms = best_ms(lambda: legacy_dedup([dict(e) for e in entities]))
+        new_ms = best_ms(lambda: classifier.dedup([dict(e) for e in entities]))
+        kept = len(classifier.dedup([dict(e) for e in entities]))
+        print(f"{n:9d} {doc_len:8d} {old_ms:9.2f} {new_ms:9.2f} {old_ms / new_ms:7.1f}x {kept:6d}")
+
+
+if __name__ == "__main__":
+    run()
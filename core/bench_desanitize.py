@@ -0,0 +1,67 @@
+"""
+micro-benchmark: AliasManager.desanitize (one pass over a trie of fakes)
+vs the old loop of str.replace per alias, longest first
+
+long LLM answers that mention a sample of a session's aliases, for
+sessions with more and more aliases
+
+run: python bench_desanitize.py
+"""
+
+import os, random, sys, timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.alias_manager import AliasManager
+
+# (aliases in the session, chars of LLM answer)
+SIZES = [(50, 5_000), (200, 20_000), (500, 50_000), (1_000, 100_000)]
+REPEAT = 3
+
+WORDS = ("the of and to in is that for it as with was on be by this are from "
+         "contract review meeting budget plan report team project quarter").split()
+
+
+def legacy_desanitize(fake_to_real, text):
+    """the old desanitize, straight copy"""
+    for fake, real in sorted(fake_to_real.items(), key=lambda x: len(x[0]), reverse=True):
+        text = text.replace(fake, real)
+    return text
+
+
+def session(rng, n):
+    manager = AliasManager()
+    labels = ["person", "organization", "location", "email"]
+    for i in range(n):
+        manager.get_or_create(f"Real Entity {i}", labels[i % len(labels)])
+    return manager
+
+
+def answer(rng, fakes, chars):
+    words = []
+    length = 0
+    while length < chars:
+        word = rng.choice(fakes) if rng.random() < 0.05 else rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def best_ms(fn):
+    return min(timeit.repeat(fn, number=1, repeat=REPEAT)) * 1000
+
+
+def run():
+    rng = random.Random(5)
+    print(f"{'aliases':>8s} {'chars':>8s} {'old ms':>9s} {'new ms':>9s} {'speedup':>8s}")
+    print("-" * 46)
+    for n, chars in SIZES:
+        manager = session(rng, n)
+        text = answer(rng, list(manager.fake_to_real), chars)
+        manager.desanitize("warm up")  # first call fills the trie
+        old_ms = best_ms(lambda: legacy_desanitize(manager.fake_to_real, text))
+        new_ms = best_ms(lambda: manager.desanitize(text))
+        print(f"{n:8d} {chars:8d} {old_ms:9.2f} {new_ms:9.2f} {old_ms / new_ms:7.1f}x")
+
+
+if __name__ == "__main__":
+    run()
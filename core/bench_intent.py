@@ -0,0 +1,126 @@
+"""
+intent sources side by side on the labelled prompts in intent_labels.json:
+the in-process model (intent_model.py), the keyword heuristics and, if
+ollama is up, the LLM
+
+model numbers are cross-validated - every prompt is scored by a model
+trained on the other folds, so it never sees its own labels. prints
+accuracy / task recall per source, how often model and LLM agree, the
+entities they disagree on, and time per prompt
+
+run: python bench_intent.py            # model + heuristics (+ LLM if ollama is running)
+     python bench_intent.py --no-llm   # skip the LLM even if it's there
+"""
+
+import os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.entity_classifier import EntityClassifier
+from core.intent_classifier import IntentClassifier
+from core.intent_model import IntentModel, load_examples
+
+FOLDS = 5
+
+
+def model_predictions(examples, classifier):
+    """cross-validated P(task) >= threshold per example, and ms per prompt"""
+    preds = [None] * len(examples)
+    timings = []
+    for fold in range(FOLDS):
+        train = [(p, ents, y) for i, (_, p, ents, y) in enumerate(examples) if i % FOLDS != fold]
+        model = IntentModel.train(train, classifier.TOPIC_PATTERNS, classifier.IDENTITY_ANCHORS)
+        for i, (_, prompt, entities, _) in enumerate(examples):
+            if i % FOLDS == fold:
+                t0 = time.perf_counter()
+                proba = model.predict_proba(prompt, entities)
+                timings.append((time.perf_counter() - t0) * 1000)
+                preds[i] = [bool(p >= model.threshold) for p in proba]
+    return preds, timings
+
+
+def heuristic_predictions(examples, classifier):
+    preds, timings = [], []
+    for _, prompt, entities, _ in examples:
+        t0 = time.perf_counter()
+        analysis = classifier._analyze_prompt(prompt)
+        preds.append([classifier._is_task_relevant(e, analysis, prompt) for e in entities])
+        timings.append((time.perf_counter() - t0) * 1000)
+    return preds, timings
+
+
+def llm_predictions(examples, intent_clf):
+    preds, timings = [], []
+    for _, prompt, entities, _ in examples:
+        t0 = time.perf_counter()
+        result = intent_clf.classify(prompt, [e["text"] for e in entities])
+        timings.append((time.perf_counter() - t0) * 1000)
+        if result is None:
+            preds.append(None)
+            continue
+        task = {t.lower() for t in result["task"]}
+        preds.append([e["text"].lower() in task for e in entities])
+    return preds, timings
+
+
+def scores(examples, preds):
+    correct = total = task_hit = task_total = 0
+    for (_, _, _, y), pred in zip(examples, preds):
+        if pred is None:
+            continue
+        for p, label in zip(pred, y):
+            total += 1
+            correct += p == bool(label)
+            if label:
+                task_total += 1
+                task_hit += p
+    return correct / max(total, 1), task_hit / max(task_total, 1), total
+
+
+def agreement(examples, a, b):
+    """share of entities two sources agree on, and the ones they don't"""
+    same = total = 0
+    diffs = []
+    for (pid, _, entities, y), pa, pb in zip(examples, a, b):
+        if pa is None or pb is None:
+            continue
+        for e, x1, x2, label in zip(entities, pa, pb, y):
+            total += 1
+            if x1 == x2:
+                same += 1
+            else:
+                diffs.append((pid, e["text"], x1, x2, bool(label)))
+    return same / max(total, 1), diffs
+
+
+def run(use_llm=True):
+    examples = load_examples()
+    classifier = EntityClassifier()
+    n = sum(len(y) for *_, y in examples)
+    print(f"{len(examples)} prompts, {n} labelled entities, {FOLDS}-fold for the model\n")
+
+    sources = {}
+    sources["model"] = model_predictions(examples, classifier)
+    sources["heuristic"] = heuristic_predictions(examples, classifier)
+    if use_llm:
+        intent_clf = IntentClassifier(cache_path=None)
+        if intent_clf.available:
+            sources["llm"] = llm_predictions(examples, intent_clf)
+        else:
+            print("ollama not running, no LLM column\n")
+
+    print(f"{'source':>10s} {'accuracy':>9s} {'task recall':>12s} {'entities':>9s} {'ms/prompt':>10s}")
+    print("-" * 55)
+    for name, (preds, timings) in sources.items():
+        acc, recall, total = scores(examples, preds)
+        print(f"{name:>10s} {acc:9.1%} {recall:12.1%} {total:9d} {sum(timings) / len(timings):10.3f}")
+
+    other = "llm" if "llm" in sources else "heuristic"
+    rate, diffs = agreement(examples, sources["model"][0], sources[other][0])
+    print(f"\nmodel vs {other}: agree on {rate:.1%} of entities, {len(diffs)} disagreements")
+    for pid, text, m, o, label in diffs:
+        print(f"  [{pid}] {text:30s} model={'task' if m else 'identity':8s} "
+              f"{other}={'task' if o else 'identity':8s} label={'task' if label else 'identity'}")
+
+
+if __name__ == "__main__":
+    run(use_llm="--no-llm" not in sys.argv)
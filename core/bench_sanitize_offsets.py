@@ -0,0 +1,70 @@
+"""
+micro-benchmark: AliasManager.sanitize_by_offsets (segments joined once)
+vs the old right-to-left text[:start] + alias + text[end:] loop
+
+documents with more and more entities, aliases already made so only the
+text building is timed
+
+run: python bench_sanitize_offsets.py
+"""
+
+import os, random, sys, timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.alias_manager import AliasManager
+
+# (entities, chars of document)
+SIZES = [(50, 5_000), (500, 50_000), (2_000, 200_000), (10_000, 1_000_000)]
+REPEAT = 3
+
+WORDS = ("the of and to in is that for it as with was on be by this are from "
+         "contract review meeting budget plan report team project quarter").split()
+
+
+def legacy_sanitize_by_offsets(manager, text, classified_entities):
+    """the old sanitize_by_offsets, straight copy"""
+    to_replace = [e for e in classified_entities if e.get("tier") != "PRESERVE"]
+    to_replace.sort(key=lambda e: e["start"], reverse=True)
+    for entity in to_replace:
+        alias = manager.get_or_create(entity["text"], entity["label"], entity.get("tier", "REPLACE"))
+        text = text[:entity["start"]] + alias + text[entity["end"]:]
+    return text
+
+
+def document(rng, n, chars):
+    """text with n person entities spread through it, and the entity dicts"""
+    parts, entities = [], []
+    length = 0
+    gap = chars // n
+    for i in range(n):
+        filler = " ".join(rng.choice(WORDS) for _ in range(gap // 5)) + " "
+        parts.append(filler)
+        length += len(filler)
+        name = f"Person {i}"
+        entities.append({"text": name, "label": "person", "start": length, "end": length + len(name),
+                         "tier": "REPLACE"})
+        parts.append(name)
+        length += len(name)
+    return "".join(parts), entities
+
+
+def best_ms(fn):
+    return min(timeit.repeat(fn, number=1, repeat=REPEAT)) * 1000
+
+
+def run():
+    rng = random.Random(5)
+    print(f"{'entities':>8s} {'chars':>9s} {'old ms':>9s} {'new ms':>9s} {'speedup':>8s}")
+    print("-" * 47)
+    for n, chars in SIZES:
+        text, entities = document(rng, n, chars)
+        manager = AliasManager()
+        new = manager.sanitize_by_offsets(text, entities)  # makes the aliases
+        assert new == legacy_sanitize_by_offsets(manager, text, entities)
+        old_ms = best_ms(lambda: legacy_sanitize_by_offsets(manager, text, entities))
+        new_ms = best_ms(lambda: manager.sanitize_by_offsets(text, entities))
+        print(f"{n:8d} {chars:9d} {old_ms:9.2f} {new_ms:9.2f} {old_ms / new_ms:7.1f}x")
+
+
+if __name__ == "__main__":
+    run()
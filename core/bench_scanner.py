@@ -0,0 +1,80 @@
+"""
+micro-benchmark: single-pass PatternScanner vs the old one-finditer-per-pattern scan
+
+builds synthetic documents (5k - 50k chars) of filler text with PII
+sprinkled in, then times both scanners and the classifier dedup after
+each, since the old scanner's overlapping matches were what made
+classify do extra work
+
+run: python bench_scanner.py
+"""
+
+import os, random, sys, timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.pattern_scanner import PatternScanner
+from core.entity_classifier import EntityClassifier
+
+SIZES = [5_000, 10_000, 25_000, 50_000]
+REPEAT = 5
+
+FILLER = (
+    "The quarterly report covers revenue, churn and hiring plans for the next cycle. "
+    "Please review the attached notes before Thursday and flag anything unclear. "
+)
+PII = [
+    "SSN 456-78-9012", "email priya.sharma@infosys.com", "server 10.20.30.40",
+    "card 4111-1111-1111-1111", "aadhaar 8847 2910 5384", "PAN ABCDE1234F",
+    "call +91-99887-76655", "or (555) 123-4567", "docs at https://wiki.example.com/page?id=42",
+    "order 1234 5678 9012 3456",
+]
+
+
+def legacy_scan(text):
+    """the old scanner: one finditer per pattern, overlaps and all"""
+    entities = []
+    for label, pattern in PatternScanner.PATTERNS.items():
+        for match in pattern.finditer(text):
+            entities.append({
+                "text": match.group(), "label": label,
+                "start": match.start(), "end": match.end(), "source": "regex",
+            })
+    return entities
+
+
+def make_doc(size, rng):
+    parts = []
+    while sum(len(p) for p in parts) < size:
+        parts.append(FILLER if rng.random() < 0.6 else rng.choice(PII) + ". ")
+    return "".join(parts)[:size]
+
+
+def best_ms(fn):
+    return min(timeit.repeat(fn, number=1, repeat=REPEAT)) * 1000
+
+
+def run():
+    rng = random.Random(7)
+    scanner = PatternScanner()
+    classifier = EntityClassifier()
+
+    print(f"{'chars':>7s} {'old ms':>8s} {'new ms':>8s} {'speedup':>8s} "
+          f"{'old hits':>9s} {'new hits':>9s} {'old+dedup ms':>13s} {'new+dedup ms':>13s}")
+    print("-" * 84)
+    for size in SIZES:
+        doc = make_doc(size, rng)
+
+        old_ms = best_ms(lambda: legacy_scan(doc))
+        new_ms = best_ms(lambda: scanner.scan(doc))
+        old_hits = len(legacy_scan(doc))
+        new_hits = len(scanner.scan(doc))
+
+        old_total = best_ms(lambda: classifier.classify(legacy_scan(doc), []))
+        new_total = best_ms(lambda: classifier.classify(scanner.scan(doc), []))
+
+        print(f"{size:7d} {old_ms:8.2f} {new_ms:8.2f} {old_ms / new_ms:7.1f}x "
+              f"{old_hits:9d} {new_hits:9d} {old_total:13.2f} {new_total:13.2f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,118 @@
+"""
+cache.py - small two-tier result cache
+
+tier 1 is an in-memory LRU with a TTL, tier 2 is an optional sqlite
+file so results survive restarts. values are stored as JSON, so every
+get() hands back a fresh copy and callers can mutate it freely
+(the classifier edits entity dicts in place).
+
+memory only is the default. the sqlite file is NOT encrypted: for the NER
+and intent caches it holds the raw entity texts (names, emails, ids) in
+plaintext, so only set a path on a disk you'd trust with the prompts themselves
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_warned_paths = set()
+
+
+class TieredCache:
+
+    def __init__(self, max_entries: int = 2048, ttl: float | None = 3600, path: str | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl  # seconds, None = never expires
+        self.path = path
+
+        self._mem = OrderedDict()  # key -> (expires_at, json string)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if path:
+            if path not in _warned_paths:
+                _warned_paths.add(path)
+                print(f"[cache] WARNING: {path} keeps cached values unencrypted on disk (plaintext PII for NER / intent)")
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """hash anything JSON-able into a fixed-size key"""
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """cached value or None"""
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                expires_at, raw = item
+                if expires_at is None or expires_at > now:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(raw)
+                del self._mem[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT expires_at, value FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    expires_at, raw = row
+                    if expires_at is None or expires_at > now:
+                        self._remember(key, expires_at, raw)
+                        self.disk_hits += 1
+                        return json.loads(raw)
+                    self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value):
+        raw = json.dumps(value, ensure_ascii=False)
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._remember(key, expires_at, raw)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, expires_at, value) VALUES (?, ?, ?)",
+                    (key, expires_at, raw),
+                )
+                self._db.commit()
+
+    def _remember(self, key, expires_at, raw):
+        self._mem[key] = (expires_at, raw)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "entries": len(self._mem),
+            "persistent": self._db is not None,
+        }
+
+    def clear(self):
+        """drop everything, both tiers"""
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
@@ -0,0 +1,153 @@
+"""
+circuit_breaker.py - stops waiting on a dependency that's down or hanging
+
+  closed     calls go through. failure_threshold failures (errors, timeouts
+             or calls slower than slow_call_s) in a row -> open
+  open       calls are refused straight away so the caller uses its
+             fallback. a background thread runs probe() every
+             probe_interval seconds, the first success -> half_open
+  half_open  exactly one trial call goes through, everyone else is
+             refused (falls back) while it's out. trial succeeds ->
+             closed, fails or is slow -> open again
+
+allow() is asked right before the call and takes the trial slot in half
+open, so report every allowed call back with record_success /
+record_failure, or release() if it never reached the dependency.
+ready() answers the same question without taking the slot
+
+used for the ollama intent path, so a hung local LLM costs a few
+timeouts instead of one on every request, and an ollama that comes up
+later gets picked up without a restart.
+"""
+
+import threading
+import time
+
+
+class CircuitBreaker:
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, probe=None, failure_threshold: int = 3, slow_call_s: float = 5.0,
+                 probe_interval: float = 10.0, name: str = "breaker"):
+        # probe: no-arg callable, True when the dependency looks healthy again
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.slow_call_s = slow_call_s
+        self.probe_interval = probe_interval
+        self.name = name
+
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0  # in a row
+        self.opened_at = None
+        self.last_error = ""
+        self._prober = None
+        self._trial = False  # half open: the one trial call is out
+
+        # stats
+        self.calls = 0
+        self.rejected = 0
+        self.slow_calls = 0
+        self.failed_calls = 0
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        """can a call go through right now. in half open this takes the one trial slot"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            self.rejected += 1
+            return False
+
+    def ready(self) -> bool:
+        """would allow() say yes - without taking the trial slot. a peek, so not a rejection"""
+        with self._lock:
+            return self.state == self.CLOSED or (self.state == self.HALF_OPEN and not self._trial)
+
+    def release(self):
+        """an allowed call that never got made (cancelled), free the trial slot"""
+        with self._lock:
+            self._trial = False
+
+    def record_success(self, duration: float = 0.0):
+        """a call came back. slower than slow_call_s still counts as a failure"""
+        if duration > self.slow_call_s:
+            with self._lock:
+                self.slow_calls += 1
+            self.record_failure(f"slow call ({duration:.1f}s)")
+            return
+        with self._lock:
+            self.calls += 1
+            self.failures = 0
+            self._trial = False
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+                print(f"[{self.name}] closed")
+
+    def record_failure(self, error: str = ""):
+        with self._lock:
+            self.calls += 1
+            self.failed_calls += 1
+            self.failures += 1
+            self.last_error = error
+            self._trial = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self._open()
+
+    def trip(self, error: str = ""):
+        """open now, e.g. the dependency wasn't there at startup"""
+        with self._lock:
+            self.last_error = error
+            if self.state != self.OPEN:
+                self._open()
+
+    def _open(self):
+        # lock is held by the caller
+        self.state = self.OPEN
+        self._trial = False
+        self.opened_at = time.time()
+        self.times_opened += 1
+        print(f"[{self.name}] open: {self.last_error}")
+        if self.probe is not None and (self._prober is None or not self._prober.is_alive()):
+            self._prober = threading.Thread(target=self._probe_loop, name=f"{self.name}-probe", daemon=True)
+            self._prober.start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.probe_interval)
+            try:
+                healthy = self.probe()
+            except Exception:
+                healthy = False
+            with self._lock:
+                if self.state != self.OPEN:
+                    return
+                if healthy:
+                    self.state = self.HALF_OPEN
+                    self.failures = 0
+                    self._trial = False
+                    print(f"[{self.name}] probe ok, half open")
+                    return
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "failure_threshold": self.failure_threshold,
+                "slow_call_s": self.slow_call_s,
+                "open_for_s": round(time.time() - self.opened_at, 1) if self.state == self.OPEN else 0.0,
+                "trial_in_flight": self._trial,
+                "times_opened": self.times_opened,
+                "calls": self.calls,
+                "failed_calls": self.failed_calls,
+                "slow_calls": self.slow_calls,
+                "rejected": self.rejected,
+                "last_error": self.last_error,
+            }
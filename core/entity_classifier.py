@@ -3,12 +3,27 @@ entity_classifier.py - merges regex + NER entities, deduplicates
 overlapping ones, assigns tiers, and does privacy scoring
 """
 
+import asyncio
+import os
 import re
+from bisect import bisect_left, bisect_right
 
 try:
     from .intent_classifier import IntentClassifier
+    from .intent_model import INTENT_MODEL_PATH, IntentModel
+    from .gazetteer import GAZETTEER_DIR, Gazetteer
 except ImportError:
     from intent_classifier import IntentClassifier
+    from intent_model import INTENT_MODEL_PATH, IntentModel
+    from gazetteer import GAZETTEER_DIR, Gazetteer
+
+
+# where task vs identity decisions come from:
+#   llm       - ollama, heuristics when it's down (default)
+#   model     - the in-process model from intent_model.py, no ollama at all
+#   heuristic - just the keyword rules below
+INTENT_SOURCES = ("llm", "model", "heuristic")
+INTENT_SOURCE = os.getenv("SP_INTENT_SOURCE", "llm")
 
 
 class EntityClassifier:
@@ -102,6 +117,29 @@ class EntityClassifier:
         "shanghai", "beijing",
     }
 
+    # which whitelist an entity label is checked against
+    WHITELIST_GROUPS = {
+        "organization": "organization",
+        "product name": "organization",
+        "location": "location",
+    }
+
+    def __init__(self, gazetteer_dir: str = GAZETTEER_DIR, intent_source: str = INTENT_SOURCE,
+                 intent_model_path: str = INTENT_MODEL_PATH):
+        if intent_source not in INTENT_SOURCES:
+            raise ValueError(f"unknown intent source {intent_source!r}, pick one of {INTENT_SOURCES}")
+        self.intent_source = intent_source
+        self.intent_model_path = intent_model_path
+
+        # the sets above are the seed, bigger lists come from gazetteer files
+        seed = {
+            ("whitelist", "organization"): self.WHITELISTED_ORGS,
+            ("whitelist", "location"): self.WHITELISTED_CITIES,
+        }
+        for label, names in self.FALSE_POSITIVES.items():
+            seed[("false_positive", label)] = names
+        self.gazetteer = Gazetteer.load(gazetteer_dir, seed)
+
     def classify(self, regex_entities: list[dict], ner_entities: list[dict]) -> list[dict]:
         """merge both entity lists, dedup overlaps, assign tiers"""
         all_entities = []
@@ -119,44 +157,41 @@ class EntityClassifier:
         # filter false positives
         filtered = []
         for e in all_entities:
-            label = e["label"].lower()
-            text_lower = e["text"].lower().strip()
-            fp_set = self.FALSE_POSITIVES.get(label, set())
-            if text_lower in fp_set:
+            if self.gazetteer.is_false_positive(e["text"], e["label"].lower()):
                 continue
             filtered.append(e)
 
-        # sort by span length desc (longest first wins dedup)
-        filtered.sort(key=lambda e: e["end"] - e["start"], reverse=True)
+        kept = self.dedup(filtered)
 
-        # greedy dedup - if >50% overlap with something we already kept, skip it
-        kept = []
-        occupied = set()
-
-        for entity in filtered:
-            span = set(range(entity["start"], entity["end"]))
-            overlap = span & occupied
-            if len(overlap) > len(span) * 0.5:
-                continue
+        for entity in kept:
             label = entity["label"].lower()
             entity["tier"] = self.TIER_MAP.get(label, "REPLACE")
 
             # P3: check whitelist - if this is a well-known thing, preserve it
             # (the LLM intent classifier might override this later anyway,
             #  but this catches cases even when ollama is down)
-            text_lower = entity["text"].lower().strip()
-            if label in ("organization", "product name"):
-                if text_lower in self.WHITELISTED_ORGS:
-                    entity["tier"] = "PRESERVE"
-                    entity["whitelist"] = True
-            elif label == "location":
-                if text_lower in self.WHITELISTED_CITIES:
-                    entity["tier"] = "PRESERVE"
-                    entity["whitelist"] = True
+            group = self.WHITELIST_GROUPS.get(label, label)
+            if self.gazetteer.is_whitelisted(entity["text"], group):
+                entity["tier"] = "PRESERVE"
+                entity["whitelist"] = True
 
-            kept.append(entity)
-            occupied |= span
+        return kept
+
+    def dedup(self, entities: list[dict]) -> list[dict]:
+        """
+        greedy dedup, longest span first - if >50% of a span overlaps
+        something already kept, skip it. returns the kept ones, longest first
+        """
+        entities = sorted(entities, key=lambda e: e["end"] - e["start"], reverse=True)
 
+        kept = []
+        occupied = _Occupied()
+        for entity in entities:
+            start, end = entity["start"], entity["end"]
+            if occupied.overlap(start, end) > max(end - start, 0) * 0.5:
+                continue
+            kept.append(entity)
+            occupied.add(start, end)
         return kept
 
     # --- intent detection ---
@@ -183,41 +218,114 @@ class EntityClassifier:
         re.compile(r'\b(?:flying out of|departing from|leaving from)\b', re.I),
     ]
 
-    def _is_task_relevant(self, entity_text, entity_label, full_prompt):
+    # an anchor has to end within this many chars before the entity
+    ANCHOR_WINDOW = 40
+
+    # all the identity anchors as one lookahead regex: a single scan gives
+    # every anchor position in the prompt, overlapping ones included
+    _ANCHOR_SCAN = re.compile("(?=(" + "|".join(f"(?:{a.pattern})" for a in IDENTITY_ANCHORS) + "))", re.I)
+
+    def _analyze_prompt(self, full_prompt):
+        """
+        the per-prompt part of the heuristics, done once instead of per entity:
+        is it a topic prompt, and where are the identity anchors (start, end)
+        """
+        is_topic = any(p.search(full_prompt) for p in self.TOPIC_PATTERNS)
+        anchors = []
+        if is_topic:
+            anchors = [(m.start(), m.start() + len(m.group(1))) for m in self._ANCHOR_SCAN.finditer(full_prompt)]
+        return is_topic, anchors
+
+    def _is_task_relevant(self, entity, analysis, full_prompt):
         """is this entity part of the users task (keep it) or their identity (replace it)"""
-        if entity_label not in ("location", "organization", "product name"):
+        if entity["label"] not in ("location", "organization", "product name"):
             return False
 
-        prompt_lower = full_prompt.lower()
-        entity_lower = entity_text.lower()
-
         # step 1: is this a topic prompt at all?
-        is_topic = any(p.search(prompt_lower) for p in self.TOPIC_PATTERNS)
+        is_topic, anchors = analysis
         if not is_topic:
             return False
 
-        # step 2: is this entity right after an identity phrase?
-        entity_pos = prompt_lower.find(entity_lower)
-        if entity_pos == -1:
-            return False
-
-        # look at the 40 chars before the entity for identity anchors
-        before = prompt_lower[max(0, entity_pos - 40):entity_pos]
-        for anchor in self.IDENTITY_ANCHORS:
-            if anchor.search(before):
+        # step 2: is this occurrence right after an identity phrase?
+        entity_pos = entity.get("start")
+        if entity_pos is None:
+            entity_pos = full_prompt.lower().find(entity["text"].lower())
+            if entity_pos == -1:
+                return False
+
+        # any anchor that sits inside the 40 chars before the entity
+        i = bisect_left(anchors, (entity_pos - self.ANCHOR_WINDOW,))
+        while i < len(anchors) and anchors[i][0] < entity_pos:
+            if anchors[i][1] <= entity_pos:
                 return False  # this IS identity, don't override
+            i += 1
 
         return True  # topic prompt + no identity anchor = task-relevant
 
     def apply_intent_overrides(self, entities, full_prompt):
         """Override tier to PRESERVE for entities that are part of the task."""
+        analysis = None
         for entity in entities:
             if entity.get("tier") == "REPLACE":
-                if self._is_task_relevant(entity["text"], entity["label"], full_prompt):
+                if analysis is None:
+                    analysis = self._analyze_prompt(full_prompt)
+                if self._is_task_relevant(entity, analysis, full_prompt):
                     entity["tier"] = "PRESERVE"
                     entity["intent_override"] = True
         return entities
 
+    def apply_intent(self, entities, full_prompt):
+        """task vs identity overrides from whichever intent_source this classifier uses"""
+        if self.intent_source == "model":
+            return self.apply_model_intent_overrides(entities, full_prompt)
+        if self.intent_source == "heuristic":
+            return self.apply_intent_overrides(entities, full_prompt)
+        return self.apply_llm_intent_overrides(entities, full_prompt)
+
+    async def aapply_intent(self, entities, full_prompt):
+        if self.intent_source == "llm":
+            return await self.aapply_llm_intent_overrides(entities, full_prompt)
+        # the local sources are sub-millisecond, no point leaving the loop
+        return self.apply_intent(entities, full_prompt)
+
+    def apply_intent_batch(self, batch):
+        """apply_intent for a list of (entities, full_prompt)"""
+        if self.intent_source == "llm":
+            return self.apply_llm_intent_overrides_batch(batch)
+        return [self.apply_intent(entities, full_prompt) for entities, full_prompt in batch]
+
+    def apply_model_intent_overrides(self, entities, full_prompt):
+        """
+        score every REPLACE entity with the in-process model (intent_model.py)
+        in one go. falls back to the heuristics if there are no weights
+        """
+        replaceable = [e for e in entities if e.get("tier") == "REPLACE"]
+        if not replaceable:
+            return entities
+
+        model = self._intent_model()
+        if model is None:
+            return self.apply_intent_overrides(entities, full_prompt)
+
+        for entity, proba in zip(replaceable, model.predict_proba(full_prompt, replaceable)):
+            if proba >= model.threshold:
+                entity["tier"] = "PRESERVE"
+                entity["intent_override"] = True
+                entity["intent_source"] = "model"
+                entity["intent_score"] = round(float(proba), 3)
+        return entities
+
+    def _intent_model(self):
+        # lazy, like the LLM client - only load weights once something needs them
+        if not hasattr(self, '_intent_mdl'):
+            try:
+                self._intent_mdl = IntentModel.load(
+                    self.intent_model_path, self.TOPIC_PATTERNS, self.IDENTITY_ANCHORS)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[intent-model] couldnt load {self.intent_model_path}: {e}, using heuristics")
+                self._intent_mdl = None
+        return self._intent_mdl
+
     def apply_llm_intent_overrides(self, entities, full_prompt):
         """
         use the local LLM (qwen2.5 via ollama) to classify entities
@@ -229,24 +337,82 @@ class EntityClassifier:
         if not replaceable:
             return entities
 
-        # try the local llm (lazy init - only check ollama once)
-        if not hasattr(self, '_intent_clf'):
-            try:
-                self._intent_clf = IntentClassifier()
-            except Exception as e:
-                print(f"[intent-llm] couldnt init: {e}")
-                self._intent_clf = None
+        intent_clf = self._intent_classifier()
+        try:
+            if intent_clf and intent_clf.available:
+                entity_texts = [e["text"] for e in replaceable]
+                result = intent_clf.classify(full_prompt, entity_texts)
+            else:
+                result = None
+        except Exception as e:
+            print(f"[intent-llm] error: {e}, falling back to heuristics")
+            result = None
+
+        return self._apply_llm_result(entities, full_prompt, result)
 
+    async def aapply_llm_intent_overrides(self, entities, full_prompt):
+        """apply_llm_intent_overrides for async callers, the ollama call doesn't block the loop"""
+        replaceable = [e for e in entities if e.get("tier") == "REPLACE"]
+        if not replaceable:
+            return entities
+
+        if not hasattr(self, '_intent_clf'):
+            # first call probes ollama with a blocking request, keep it off the loop
+            await asyncio.to_thread(self._intent_classifier)
+        intent_clf = self._intent_clf
         try:
-            if self._intent_clf and self._intent_clf.available:
+            if intent_clf and intent_clf.available:
                 entity_texts = [e["text"] for e in replaceable]
-                result = self._intent_clf.classify(full_prompt, entity_texts)
+                result = await intent_clf.aclassify(full_prompt, entity_texts)
             else:
                 result = None
         except Exception as e:
             print(f"[intent-llm] error: {e}, falling back to heuristics")
             result = None
 
+        return self._apply_llm_result(entities, full_prompt, result)
+
+    def apply_llm_intent_overrides_batch(self, batch):
+        """
+        apply_llm_intent_overrides for a list of (entities, full_prompt), with the
+        LLM questions for all of them packed into as few calls as possible.
+        a prompt the LLM didn't answer falls back to the heuristics on its own
+        """
+        todo = []
+        for i, (entities, full_prompt) in enumerate(batch):
+            replaceable = [e["text"] for e in entities if e.get("tier") == "REPLACE"]
+            if replaceable:
+                todo.append((i, full_prompt, replaceable))
+
+        results = [None] * len(batch)
+        intent_clf = self._intent_classifier() if todo else None
+        try:
+            if intent_clf and intent_clf.available:
+                answers = intent_clf.classify_batch([(prompt, texts) for _, prompt, texts in todo])
+                for (i, _, _), answer in zip(todo, answers):
+                    results[i] = answer
+        except Exception as e:
+            print(f"[intent-llm] batch error: {e}, falling back to heuristics")
+
+        out = []
+        for i, (entities, full_prompt) in enumerate(batch):
+            if not any(e.get("tier") == "REPLACE" for e in entities):
+                out.append(entities)
+            else:
+                out.append(self._apply_llm_result(entities, full_prompt, results[i]))
+        return out
+
+    def _intent_classifier(self):
+        # try the local llm (lazy init - only check ollama once)
+        if not hasattr(self, '_intent_clf'):
+            try:
+                self._intent_clf = IntentClassifier()
+            except Exception as e:
+                print(f"[intent-llm] couldnt init: {e}")
+                self._intent_clf = None
+        return self._intent_clf
+
+    def _apply_llm_result(self, entities, full_prompt, result):
         if result is None:
             # ollama failed or not available, use heuristic fallback
             # print("[intent-llm] falling back to heuristic rules")
@@ -314,3 +480,37 @@ class EntityClassifier:
             "hipaa_identifiers_found": hipaa_found,
             "hipaa_identifiers_protected": hipaa_protected,
         }
+
+
+class _Occupied:
+    """
+    char positions taken by kept entities, as sorted non-overlapping
+    [start, end) intervals. same answers as a set of every position but
+    doesn't grow with span length, and lookups are a bisect
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def overlap(self, start, end):
+        """how many chars of [start, end) are already taken"""
+        total = 0
+        i = bisect_right(self.ends, start)  # first interval ending after start
+        while i < len(self.starts) and self.starts[i] < end:
+            total += min(end, self.ends[i]) - max(start, self.starts[i])
+            i += 1
+        return total
+
+    def add(self, start, end):
+        if end <= start:
+            return
+        # every interval touching [start, end) gets merged into it
+        lo = bisect_right(self.ends, start - 1)
+        hi = lo
+        while hi < len(self.starts) and self.starts[hi] <= end:
+            start = min(start, self.starts[hi])
+            end = max(end, self.ends[hi])
+            hi += 1
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
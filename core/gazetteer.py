@@ -0,0 +1,170 @@
+"""
+gazetteer.py - name lists (orgs, cities, people, ...) in one automaton
+
+lists are plain text files in GAZETTEER_DIR, one name per line, '#'
+starts a comment. the file name says what the names are for:
+
+    detect__<label>.txt          find these in prompts as <label> entities
+    whitelist__<label>.txt       well-known <label>s, preserved instead of replaced
+    false_positive__<label>.txt  things NER tags as <label> that aren't one
+
+underscores in <label> become spaces (detect__drug_name.txt -> "drug name").
+EntityClassifier's built-in sets are passed in as the seed and always
+loaded on top of whatever files there are.
+
+every name goes into one case-insensitive Aho-Corasick automaton, so
+finding all listed names in a prompt is a single pass no matter how long
+the lists get. compiling tens of thousands of names takes a bit, so the
+built automaton is pickled into the same dir and reused until a list
+file (or the seed) changes.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+
+try:
+    from .aho_corasick import AhoCorasick
+except ImportError:
+    from aho_corasick import AhoCorasick
+
+
+GAZETTEER_DIR = os.getenv(
+    "SP_GAZETTEER_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteers")
+)
+KINDS = ("detect", "whitelist", "false_positive")
+CACHE_FILE = ".compiled.pickle"
+_CACHE_VERSION = 1
+
+
+class Gazetteer:
+
+    def __init__(self, automaton: AhoCorasick, files: list[str] | None = None):
+        self.automaton = automaton
+        self.files = files or []
+
+    @classmethod
+    def load(cls, path: str = GAZETTEER_DIR, seed: dict | None = None) -> "Gazetteer":
+        """
+        build from the list files in path plus seed, {(kind, label): names}.
+        uses the pickled automaton if nothing changed since it was written
+        """
+        files = _list_files(path)
+        seed = {key: sorted({_normalize(n) for n in names}) for key, names in (seed or {}).items()}
+        signature = _signature(path, files, seed)
+        cache_path = os.path.join(path, CACHE_FILE)
+
+        automaton = _read_cache(cache_path, signature)
+        if automaton is None:
+            tags = {}  # name -> {(kind, label), ...}
+            for (kind, label), names in seed.items():
+                for name in names:
+                    tags.setdefault(name, set()).add((kind, label))
+            for fname in files:
+                kind, label = _parse_filename(fname)
+                for name in _read_names(os.path.join(path, fname)):
+                    tags.setdefault(name, set()).add((kind, label))
+
+            automaton = AhoCorasick()
+            for name, name_tags in tags.items():
+                automaton.add(name, frozenset(name_tags))
+            automaton.build()
+            _write_cache(cache_path, signature, automaton)
+            print(f"[gazetteer] compiled {len(automaton)} names from {len(files)} list file(s)")
+
+        return cls(automaton, files)
+
+    def tags(self, text: str) -> frozenset:
+        """(kind, label) tags for an exact name, empty if it's in no list"""
+        return self.automaton.get(_normalize(text), frozenset())
+
+    def is_whitelisted(self, text: str, label: str) -> bool:
+        return ("whitelist", label) in self.tags(text)
+
+    def is_false_positive(self, text: str, label: str) -> bool:
+        return ("false_positive", label) in self.tags(text)
+
+    def scan(self, text: str) -> list[tuple]:
+        """every listed name in text as (start, end, tags), whole words, longest match wins"""
+        return self.automaton.find(text)
+
+    def detect(self, text: str) -> list[dict]:
+        """entities for names from the detect__ lists, same shape as PatternScanner.scan"""
+        entities = []
+        for start, end, tags in self.scan(text):
+            labels = sorted(label for kind, label in tags if kind == "detect")
+            if not labels:
+                continue
+            entities.append({
+                "text": text[start:end],
+                "label": labels[0],
+                "start": start,
+                "end": end,
+                "source": "gazetteer",
+            })
+        return entities
+
+    def __len__(self):
+        return len(self.automaton)
+
+
+def _normalize(name):
+    return " ".join(name.lower().split())
+
+
+def _list_files(path):
+    if not os.path.isdir(path):
+        return []
+    return sorted(
+        f for f in os.listdir(path)
+        if f.endswith(".txt") and "__" in f and f.split("__", 1)[0] in KINDS
+    )
+
+
+def _parse_filename(fname):
+    kind, label = fname[:-len(".txt")].split("__", 1)
+    return kind, label.replace("_", " ").lower()
+
+
+def _read_names(file_path):
+    with open(file_path, encoding="utf-8") as f:
+        for line in f:
+            name = _normalize(line.split("#", 1)[0])
+            if name:
+                yield name
+
+
+def _signature(path, files, seed):
+    """changes whenever a list file is touched or the seed lists change"""
+    stamp = []
+    for fname in files:
+        st = os.stat(os.path.join(path, fname))
+        stamp.append([fname, st.st_mtime_ns, st.st_size])
+    seed_items = sorted([kind, label, names] for (kind, label), names in seed.items())
+    blob = json.dumps([_CACHE_VERSION, stamp, seed_items], ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _read_cache(cache_path, signature):
+    try:
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if not isinstance(cached, dict) or cached.get("signature") != signature:
+        return None
+    return cached.get("automaton")
+
+
+def _write_cache(cache_path, signature, automaton):
+    if not os.path.isdir(os.path.dirname(cache_path)):
+        return
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"signature": signature, "automaton": automaton}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        # read-only dir etc, we just compile again next time
+        print(f"[gazetteer] couldnt write cache: {e}")
@@ -5,46 +5,220 @@ which entities are part of the user's task vs their identity
 basically we ask qwen to look at the prompt and tell us
 "is Paris a travel destination or the user's home address?"
 
-falls back gracefully if ollama isnt running
+falls back gracefully if ollama isnt running. a circuit breaker
+(circuit_breaker.py) stops calling it after a few failures / slow calls
+and probes /api/tags in the background until it's back
+
+answers are cached two ways: the whole (prompt, entities) question, and
+per entity with the text around it, so a new prompt that mentions
+"Paris" the same way as an old one doesn't need the LLM for Paris.
+memory only by default. SP_INTENT_CACHE = sqlite file to keep them across
+restarts - it stores entity texts and the text around them in plaintext
+
+the model only sees the text around each entity, and answers through
+ollama's structured outputs (a JSON schema in "format", ollama 0.5+)
 """
 
+import asyncio
 import json
+import os
+import threading
+import time
 import httpx
 
+try:
+    from .cache import TieredCache
+    from .circuit_breaker import CircuitBreaker
+except ImportError:
+    from cache import TieredCache
+    from circuit_breaker import CircuitBreaker
+
 
 # ollama runs on this by default
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_BASE_URL = os.getenv("SP_OLLAMA_URL", "http://localhost:11434")
+OLLAMA_URL = OLLAMA_BASE_URL + "/api/generate"
 MODEL_NAME = "qwen2.5:1.5b-instruct"
 TIMEOUT = 15  # seconds, first call can be slow if model needs loading
 
+# connection pool to ollama, shared by all calls (sync and async)
+MAX_CONNECTIONS = 8
+MAX_KEEPALIVE = 4
+
+# circuit breaker: open after this many failures / slow calls in a row,
+# a call slower than SLOW_CALL_S counts as a failure
+BREAKER_FAILURES = 3
+SLOW_CALL_S = 5.0
+PROBE_INTERVAL = 10.0  # seconds between /api/tags probes while open
+
+# classify_batch packs items into one generation up to this many tokens
+# (ollama's default num_ctx), counting the answer too
+BATCH_CONTEXT_TOKENS = 2048
+BATCH_MAX_ITEMS = 8
+BATCH_OVERHEAD_TOKENS = 80  # the instructions around the items
+CHARS_PER_TOKEN = 4  # rough, fine for sizing
+
+# how long ollama keeps the model loaded after a call (its default is 5m,
+# after which the next request pays for a cold load)
+KEEP_ALIVE = os.getenv("SP_OLLAMA_KEEP_ALIVE", "30m")
+
+INTENT_CACHE_PATH = os.getenv("SP_INTENT_CACHE")
+INTENT_CACHE_TTL = 24 * 3600
+CONTEXT_CHARS = 60  # chars either side of an entity: its context key, and all the LLM sees of the prompt
+
+# ollama structured outputs - generation is constrained to these, no free text to dig JSON out of
+_STRINGS = {"type": "array", "items": {"type": "string"}}
+ANSWER_SCHEMA = {
+    "type": "object",
+    "properties": {"task": _STRINGS, "identity": _STRINGS},
+    "required": ["task", "identity"],
+}
+BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"id": {"type": "integer"}, "task": _STRINGS, "identity": _STRINGS},
+                "required": ["id", "task", "identity"],
+            },
+        },
+    },
+    "required": ["items"],
+}
+
+INSTRUCTIONS = (
+    'Label each entity "task" (part of what the user wants done: a destination, a product '
+    'to compare, a topic) or "identity" (reveals who the user is: their name, home, employer, '
+    'id, email). Answer in JSON.'
+)
+
+
+def _excerpt(prompt, entity_texts):
+    """
+    the parts of the prompt within CONTEXT_CHARS of an entity, gaps
+    replaced by "...". that's enough to tell "trip to Paris" from
+    "I live in Paris" and a lot fewer tokens than the whole prompt
+    """
+    text = " ".join(prompt.split())
+    lower = text.lower()
+    spans = []
+    for entity in entity_texts:
+        pos = lower.find(entity.lower())
+        if pos != -1:
+            spans.append((max(0, pos - CONTEXT_CHARS), min(len(text), pos + len(entity) + CONTEXT_CHARS)))
+    if not spans:
+        return text[:2 * CONTEXT_CHARS]
+    spans.sort()
+    merged = [list(spans[0])]
+    for start, end in spans[1:]:
+        if start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    parts = [text[start:end] for start, end in merged]
+    excerpt = " ... ".join(parts)
+    if merged[0][0] > 0:
+        excerpt = "..." + excerpt
+    if merged[-1][1] < len(text):
+        excerpt += "..."
+    return excerpt
+
+
+def _estimate_tokens(prompt, entity_texts):
+    chars = min(len(prompt), len(entity_texts) * (2 * CONTEXT_CHARS + 8)) + sum(len(e) + 2 for e in entity_texts) + 20
+    return chars // CHARS_PER_TOKEN + 1
+
+
+def _output_tokens(entity_texts):
+    """room for {"id": n, "task": [...], "identity": [...]} with these entities in it"""
+    return 16 + sum(len(e) // CHARS_PER_TOKEN + 3 for e in entity_texts)
+
+
+class _Pending:
+    """what's left to ask the LLM after the cache lookups for one classify call"""
+    __slots__ = ("entities", "full_key", "context_keys", "verdicts", "missing")
+
+    def __init__(self, entities, full_key, context_keys, verdicts, missing):
+        self.entities = entities
+        self.full_key = full_key
+        self.context_keys = context_keys
+        self.verdicts = verdicts
+        self.missing = missing
+
 
 class IntentClassifier:
 
-    def __init__(self):
-        self.available = False
-        self._check_ollama()
+    def __init__(self, cache_path: str | None = INTENT_CACHE_PATH, cache_size: int = 1024,
+                 cache_ttl: float | None = INTENT_CACHE_TTL, base_url: str = OLLAMA_BASE_URL,
+                 timeout: float = TIMEOUT, max_connections: int = MAX_CONNECTIONS,
+                 max_keepalive: int = MAX_KEEPALIVE, breaker_failures: int = BREAKER_FAILURES,
+                 slow_call_s: float = SLOW_CALL_S, probe_interval: float = PROBE_INTERVAL):
+        # whole answers, keyed by normalized prompt + sorted entities
+        self.cache = TieredCache(cache_size, cache_ttl, cache_path)
+        # one task/identity verdict per (entity, text around it). keys are
+        # prefixed differently so both can share one sqlite file
+        self.context_cache = TieredCache(cache_size * 4, cache_ttl, cache_path)
+
+        # keep-alive connections instead of a new one per call
+        self.base_url = base_url
+        self.timeout = timeout
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self._client = httpx.Client(base_url=base_url, limits=self.limits, timeout=timeout)
+        # the async client belongs to the event loop it was made on
+        self._aclient = None
+        self._aclient_loop = None
+        self._aclient_closer = None
+
+        # what the LLM calls cost
+        self._stats_lock = threading.Lock()
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.load_ms = 0.0
+        self.cold_loads = 0
+        self.parse_failures = 0
+
+        self.breaker = CircuitBreaker(
+            probe=lambda: self._check_ollama(verbose=False),
+            failure_threshold=breaker_failures, slow_call_s=slow_call_s,
+            probe_interval=probe_interval, name="intent",
+        )
+        if not self._check_ollama():
+            # not there yet - the probe picks it up whenever it starts
+            self.breaker.trip("ollama not available at startup")
 
-    def _check_ollama(self):
-        """see if ollama is actually running"""
+    @property
+    def available(self) -> bool:
+        """
+        False while the breaker is open (or half open with its trial call
+        out), callers go straight to the heuristics
+        """
+        return self.breaker.ready()
+
+    def _check_ollama(self, verbose=True):
+        """see if ollama is actually running (with our model pulled)"""
         try:
-            r = httpx.get("http://localhost:11434/api/tags", timeout=2)
+            r = self._client.get("/api/tags", timeout=2)
             if r.status_code == 200:
                 models = r.json().get("models", [])
                 # check if our model is pulled
                 model_names = [m["name"] for m in models]
                 if MODEL_NAME in model_names:
-                    self.available = True
-                    print(f"[intent] ollama ready with {MODEL_NAME}")
-                else:
+                    if verbose:
+                        print(f"[intent] ollama ready with {MODEL_NAME}")
+                    return True
+                if verbose:
                     print(f"[intent] ollama running but {MODEL_NAME} not found")
                     print(f"[intent] available models: {model_names}")
-            else:
+            elif verbose:
                 print("[intent] ollama returned weird status:", r.status_code)
         except Exception as e:
-            print(f"[intent] ollama not available: {e}")
-            self.available = False
+            if verbose:
+                print(f"[intent] ollama not available: {e}")
+        return False
 
-    def classify(self, prompt, entity_texts):
+    def classify(self, prompt, entity_texts, timeout: float | None = None):
         """
         ask the local LLM to classify entities as task or identity
         
@@ -53,100 +227,332 @@ class IntentClassifier:
         
         if anything goes wrong just returns None (caller should fallback)
         """
+        answer, pending = self._lookup(prompt, entity_texts)
+        if answer is not None:
+            return answer
         if not self.available:
             return None
+        return self._resolve(pending, self._ask_llm(prompt, pending.missing, timeout))
 
+    async def aclassify(self, prompt, entity_texts, timeout: float | None = None):
+        """classify() for async callers - waits on ollama without holding a thread"""
+        answer, pending = self._lookup(prompt, entity_texts)
+        if answer is not None:
+            return answer
+        if not self.available:
+            return None
+        return self._resolve(pending, await self._aask_llm(prompt, pending.missing, timeout))
+
+    def _lookup(self, prompt, entity_texts):
+        """(answer, None) if the caches cover everything, else (None, what to ask for)"""
         if not entity_texts:
-            return {"task": [], "identity": []}
+            return {"task": [], "identity": []}, None
+
+        prompt_norm = " ".join(prompt.split())
+        entities = sorted(set(entity_texts))
+        full_key = TieredCache.make_key("intent", MODEL_NAME, prompt_norm, entities)
+        cached = self.cache.get(full_key)
+        if cached is not None:
+            return cached, None
+
+        # per-entity verdicts from earlier prompts, only the rest go to the LLM
+        context_keys = {e: self._context_key(prompt_norm, e) for e in entities}
+        verdicts = {}
+        for entity, key in context_keys.items():
+            if key is not None:
+                hit = self.context_cache.get(key)
+                if hit is not None:
+                    verdicts[entity] = hit
+        missing = [e for e in entities if e not in verdicts]
+
+        pending = _Pending(entities, full_key, context_keys, verdicts, missing)
+        if not missing:
+            return self._resolve(pending, {}), None
+        return None, pending
+
+    def _resolve(self, pending, result):
+        """merge the LLM's result into the cached verdicts, cache it all. None if the LLM failed"""
+        if result is None:
+            return None
+        verdicts = pending.verdicts
+        task = {t.lower() for t in result.get("task", []) if isinstance(t, str)}
+        identity = {t.lower() for t in result.get("identity", []) if isinstance(t, str)}
+        for entity in pending.missing:
+            # entities the model left out of both lists dont get a verdict cached
+            if entity.lower() in task:
+                verdicts[entity] = "task"
+            elif entity.lower() in identity:
+                verdicts[entity] = "identity"
+            else:
+                continue
+            if pending.context_keys[entity] is not None:
+                self.context_cache.set(pending.context_keys[entity], verdicts[entity])
 
-        # build the prompt for qwen
-        entities_str = ", ".join(entity_texts)
+        answer = {
+            "task": [e for e in pending.entities if verdicts.get(e) == "task"],
+            "identity": [e for e in pending.entities if verdicts.get(e) == "identity"],
+        }
+        self.cache.set(pending.full_key, answer)
+        return answer
 
-        llm_prompt = f"""You are a privacy intent classifier. Given a user message and a list of detected entities, classify each entity as either:
-- "task": the entity is part of what the user wants to DO (travel destination, product to compare, topic to learn about)
-- "identity": the entity reveals WHO the user IS (their name, address, employer, ID number, email)
+    def _context_key(self, prompt_norm, entity):
+        """(entity, the text around its first mention), None if it's not in the prompt"""
+        pos = prompt_norm.lower().find(entity.lower())
+        if pos == -1:
+            return None
+        window = prompt_norm[max(0, pos - CONTEXT_CHARS):pos + len(entity) + CONTEXT_CHARS].lower()
+        return TieredCache.make_key("intent-ctx", MODEL_NAME, entity.lower(), window)
+
+    def cache_stats(self) -> dict:
+        return {"prompts": self.cache.stats(), "contexts": self.context_cache.stats()}
+
+    def classify_batch(self, items, timeout: float | None = None) -> list:
+        """
+        classify() for many (prompt, entity_texts) items. whatever the caches
+        don't cover is packed into as few LLM calls as fit the model context,
+        one result per item in order. an item the model skipped or mangled
+        comes back None on its own, so only that one falls back
+        """
+        results = [None] * len(items)
+        pending = []  # (index, prompt, _Pending)
+        for i, (prompt, entity_texts) in enumerate(items):
+            answer, todo = self._lookup(prompt, entity_texts)
+            if answer is not None:
+                results[i] = answer
+            else:
+                pending.append((i, prompt, todo))
+
+        for pack in self._pack(pending):
+            if not self.available:
+                break
+            if len(pack) == 1:
+                i, prompt, todo = pack[0]
+                results[i] = self._resolve(todo, self._ask_llm(prompt, todo.missing, timeout))
+                continue
+            raw = self._generate(self._batch_request([(prompt, todo.missing) for _, prompt, todo in pack]), timeout)
+            answers = self._parse_batch_response(raw, len(pack)) if raw is not None else [None] * len(pack)
+            for (i, _, todo), answer in zip(pack, answers):
+                results[i] = self._resolve(todo, answer)
+        return results
+
+    def _pack(self, pending):
+        """split pending items into batches that fit BATCH_CONTEXT_TOKENS (input + output)"""
+        packs, pack, used = [], [], BATCH_OVERHEAD_TOKENS
+        for item in pending:
+            _, prompt, todo = item
+            cost = _estimate_tokens(prompt, todo.missing) + _output_tokens(todo.missing)
+            if pack and (used + cost > BATCH_CONTEXT_TOKENS or len(pack) >= BATCH_MAX_ITEMS):
+                packs.append(pack)
+                pack, used = [], BATCH_OVERHEAD_TOKENS
+            pack.append(item)
+            used += cost
+        if pack:
+            packs.append(pack)
+        return packs
+
+    def _llm_request(self, prompt, entity_texts):
+        """the /api/generate body for one classify call"""
+        llm_prompt = f"""{INSTRUCTIONS}
+Text: "{_excerpt(prompt, entity_texts)}"
+Entities: {json.dumps(entity_texts, ensure_ascii=False)}"""
+        return self._body(llm_prompt, ANSWER_SCHEMA, 16 + _output_tokens(entity_texts))
 
-User message: "{prompt}"
+    def _batch_request(self, items):
+        """one /api/generate body for several (prompt, entity_texts) items"""
+        blocks = [
+            f"""{n}. Text: "{_excerpt(prompt, entity_texts)}"
+Entities: {json.dumps(entity_texts, ensure_ascii=False)}"""
+            for n, (prompt, entity_texts) in enumerate(items, 1)
+        ]
+        llm_prompt = f"""{INSTRUCTIONS} One object per numbered item, "id" = its number.
 
-Detected entities: [{entities_str}]
+""" + "\n".join(blocks)
+        num_predict = 32 + sum(_output_tokens(entity_texts) for _, entity_texts in items)
+        return self._body(llm_prompt, BATCH_SCHEMA, num_predict)
 
-Return ONLY valid JSON in this exact format, nothing else:
-{{"task": ["entity1", "entity2"], "identity": ["entity3", "entity4"]}}"""
+    def _body(self, llm_prompt, schema, num_predict):
+        return {
+            "model": MODEL_NAME,
+            "prompt": llm_prompt,
+            "format": schema,
+            "stream": False,
+            "keep_alive": KEEP_ALIVE,
+            "options": {
+                "temperature": 0.1,  # we want deterministic-ish answers
+                "num_predict": num_predict,  # sized to the answer, dont need a long response
+            }
+        }
 
+    def _read_response(self, resp, started):
+        """raw text the model generated, None on an http error"""
+        if resp.status_code != 200:
+            print(f"[intent] ollama error: {resp.status_code}")
+            self.breaker.record_failure(f"http {resp.status_code}")
+            return None
+        elapsed = time.perf_counter() - started
+
+        # parse before recording, a bad body is one failure (in the caller), not a success too
+        data = resp.json()
+        text = data.get("response", "")
+        self.breaker.record_success(elapsed)
+        load_ms = data.get("load_duration", 0) / 1e6
+        with self._stats_lock:
+            self.llm_calls += 1
+            self.prompt_tokens += data.get("prompt_eval_count", 0)
+            self.output_tokens += data.get("eval_count", 0)
+            self.load_ms += load_ms
+            if load_ms > 500:  # model had to be loaded from disk
+                self.cold_loads += 1
+        # print(f"[intent] raw: {text}")  # uncomment for debugging
+        return text
+
+    def _ask_llm(self, prompt, entity_texts, timeout=None):
+        """one ollama call for these entities, parsed result or None"""
+        raw = self._generate(self._llm_request(prompt, entity_texts), timeout)
+        return self._parse_answer(raw) if raw is not None else None
+
+    async def _aask_llm(self, prompt, entity_texts, timeout=None):
+        """_ask_llm on the pooled async client"""
+        raw = await self._agenerate(self._llm_request(prompt, entity_texts), timeout)
+        return self._parse_answer(raw) if raw is not None else None
+
+    def _generate(self, body, timeout=None):
+        if not self.breaker.allow():
+            return None  # another request is the half-open trial, fall back
+        started = time.perf_counter()
         try:
-            # call ollama
-            resp = httpx.post(OLLAMA_URL, json={
-                "model": MODEL_NAME,
-                "prompt": llm_prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.1,  # we want deterministic-ish answers
-                    "num_predict": 256,   # dont need a long response
-                }
-            }, timeout=TIMEOUT)
-
-            if resp.status_code != 200:
-                print(f"[intent] ollama error: {resp.status_code}")
-                return None
-
-            raw_response = resp.json().get("response", "")
-            # print(f"[intent] raw: {raw_response}")  # uncomment for debugging
-
-            # try to parse the json from the response
-            # sometimes the model wraps it in markdown code blocks
-            result = self._parse_json_response(raw_response)
-            return result
+            resp = self._client.post("/api/generate", json=body, timeout=timeout or self.timeout)
+            return self._read_response(resp, started)
+        except httpx.TimeoutException:
+            print("[intent] ollama timed out, skipping")
+            self.breaker.record_failure("timeout")
+            return None
+        except Exception as e:
+            print(f"[intent] error calling ollama: {e}")
+            self.breaker.record_failure(str(e))
+            return None
+        except BaseException:
+            self.breaker.release()  # cancelled, says nothing about ollama
+            raise
 
+    async def _agenerate(self, body, timeout=None):
+        if not self.breaker.allow():
+            return None  # another request is the half-open trial, fall back
+        started = time.perf_counter()
+        try:
+            resp = await self._async_client().post("/api/generate", json=body, timeout=timeout or self.timeout)
+            return self._read_response(resp, started)
         except httpx.TimeoutException:
             print("[intent] ollama timed out, skipping")
+            self.breaker.record_failure("timeout")
             return None
         except Exception as e:
             print(f"[intent] error calling ollama: {e}")
+            self.breaker.record_failure(str(e))
+            return None
+        except BaseException:
+            self.breaker.release()  # cancelled, says nothing about ollama
+            raise
+
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        if self._aclient is not None and self._aclient_loop is not loop:
+            self._drop_async_client()
+        if self._aclient is None:
+            self._aclient = httpx.AsyncClient(base_url=self.base_url, limits=self.limits, timeout=self.timeout)
+            self._aclient_loop = loop
+            # its connections can only be closed on this loop, and not once it's closed.
+            # asyncio.run / uvicorn cancel leftover tasks before closing the loop, this one
+            # closes the client when that happens
+            self._aclient_closer = loop.create_task(self._close_when_cancelled(self._aclient))
+        return self._aclient
+
+    def _drop_async_client(self):
+        """a call on a new loop, let go of the old loop's client without leaking its connections"""
+        loop, closer = self._aclient_loop, self._aclient_closer
+        self._aclient = self._aclient_loop = self._aclient_closer = None
+        if loop.is_running():
+            # still going in another thread, have the closer close it over there
+            loop.call_soon_threadsafe(closer.cancel)
+        # otherwise its loop is over and the closer already closed it
+
+    async def _close_when_cancelled(self, client):
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await client.aclose()
+
+    def close(self):
+        self._client.close()
+
+    async def aclose(self):
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient_closer.cancel()
+            self._aclient = self._aclient_loop = self._aclient_closer = None
+
+    def _parse_answer(self, text):
+        """{"task": [...], "identity": [...]} - the schema makes it plain JSON, None if it isn't"""
+        try:
+            parsed = json.loads(text)
+        except json.JSONDecodeError:
+            parsed = None
+        if not _is_answer(parsed):
+            self._parse_failed(text)
             return None
+        return parsed
 
-    def _parse_json_response(self, text):
+    def _parse_batch_response(self, text, n_items):
         """
-        try to extract json from the LLM response
-        models sometimes wrap it in ```json ... ``` or add extra text
+        per-item results out of a batch answer, list of n_items where
+        anything missing / malformed is None
         """
-        # first try direct parse
-        text = text.strip()
+        results = [None] * n_items
         try:
             parsed = json.loads(text)
-            if "task" in parsed and "identity" in parsed:
-                return parsed
         except json.JSONDecodeError:
-            pass
-
-        # try to find json block in markdown
-        if "```" in text:
-            # grab stuff between the backticks
-            parts = text.split("```")
-            for part in parts:
-                clean = part.strip()
-                # remove the "json" language tag if present
-                if clean.startswith("json"):
-                    clean = clean[4:].strip()
-                try:
-                    parsed = json.loads(clean)
-                    if "task" in parsed and "identity" in parsed:
-                        return parsed
-                except json.JSONDecodeError:
-                    continue
-
-        # last resort: try to find { ... } in the text
-        start = text.find("{")
-        end = text.rfind("}")
-        if start != -1 and end != -1 and end > start:
-            try:
-                parsed = json.loads(text[start:end + 1])
-                if "task" in parsed and "identity" in parsed:
-                    return parsed
-            except json.JSONDecodeError:
-                pass
+            parsed = None
+        items = parsed.get("items") if isinstance(parsed, dict) else None
+        if not isinstance(items, list):
+            self._parse_failed(text)
+            return results
 
+        for position, item in enumerate(items):
+            if not _is_answer(item):
+                continue
+            # trust the id if there is one, else the order
+            n = item.get("id", position + 1)
+            if isinstance(n, int) and 1 <= n <= n_items and results[n - 1] is None:
+                results[n - 1] = {"task": item["task"], "identity": item["identity"]}
+        return results
+
+    def _parse_failed(self, text):
+        with self._stats_lock:
+            self.parse_failures += 1
         print(f"[intent] couldnt parse LLM response: {text[:100]}")
-        return None
+
+    def llm_stats(self) -> dict:
+        """token counts, cold model loads and parse failures across all LLM calls"""
+        with self._stats_lock:
+            calls = self.llm_calls
+            return {
+                "calls": calls,
+                "prompt_tokens": self.prompt_tokens,
+                "avg_prompt_tokens": round(self.prompt_tokens / calls, 1) if calls else 0.0,
+                "output_tokens": self.output_tokens,
+                "cold_loads": self.cold_loads,
+                "load_ms": round(self.load_ms, 1),
+                "parse_failures": self.parse_failures,
+                "keep_alive": KEEP_ALIVE,
+            }
+
+
+def _is_answer(obj):
+    return (
+        isinstance(obj, dict)
+        and isinstance(obj.get("task"), list)
+        and isinstance(obj.get("identity"), list)
+    )
 
 
 # quick test
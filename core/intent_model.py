@@ -0,0 +1,283 @@
+"""
+intent_model.py - small in-process task vs identity classifier, the
+third intent source next to the ollama LLM and the keyword heuristics
+
+logistic regression over a few hand-made features per entity:
+  - entity label (location / organization / product name)
+  - topic signals (the EntityClassifier.TOPIC_PATTERNS hits for the prompt)
+  - how close each group of identity anchors ("i live", "my company", ...) ends before it
+  - first person words right before it / in its sentence, quotes, questions
+  - the words either side of it, hashed into a fixed number of buckets
+
+the per-prompt work (topic scan, anchor scan) happens once, then all entities
+of a prompt are scored as one matrix product - well under a millisecond.
+
+weights are trained offline from the labels in intent_labels.json
+(prompts from dataset.json + real_prompts.json) and live in intent_model.json:
+  python intent_model.py        # retrain + rewrite intent_model.json
+SP_INTENT_MODEL = other weights file
+"""
+
+import json
+import os
+import re
+import zlib
+
+import numpy as np
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+INTENT_MODEL_PATH = os.getenv("SP_INTENT_MODEL", os.path.join(HERE, "intent_model.json"))
+LABELS_PATH = os.path.join(HERE, "intent_labels.json")
+DATA_FILES = [os.path.join(HERE, "dataset.json"), os.path.join(HERE, "real_prompts.json")]
+
+# the only labels intent can move to PRESERVE, same as the heuristics
+LABELS = ("location", "organization", "product name")
+
+HASH_BUCKETS = 128
+LEFT_WORDS = 4   # words before the entity that go into the hashed context
+RIGHT_WORDS = 2
+ANCHOR_WINDOW = 40  # chars, an anchor ending further back than this doesn't count
+NEAR_CHARS = 25     # "my" / "our" this close before the entity
+
+_WORD = re.compile(r"[a-z0-9']+")
+_FIRST_PERSON = re.compile(r"\b(?:i|i'm|i've|my|me|we|we're|our|us)\b", re.I)
+_SENTENCE_END = re.compile(r"[.!?\n]")
+# a quote mark, not an apostrophe inside a word (it's, Children's)
+_QUOTE = re.compile(r"\"|(?<![A-Za-z])'|'(?![A-Za-z])")
+
+DENSE_FEATURES = [
+    "label:location", "label:organization", "label:product name",
+    "topic", "topic_hits",
+    # one per EntityClassifier.IDENTITY_ANCHORS group, in that order
+    "anchor:residence", "anchor:work", "anchor:origin", "anchor:departure",
+    "first_person_near", "first_person_sentence",
+    "quoted", "question", "position",
+]
+
+
+def _bucket(token):
+    # crc32, not hash() - that one changes every run
+    return len(DENSE_FEATURES) + zlib.crc32(token.encode()) % HASH_BUCKETS
+
+
+class IntentModel:
+
+    def __init__(self, weights, bias: float, topic_patterns: list, anchor_patterns: list,
+                 threshold: float = 0.5):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.topic_patterns = topic_patterns
+        self.anchor_patterns = anchor_patterns
+        self.threshold = threshold
+        if len(anchor_patterns) != 4 or len(self.weights) != self.n_features():
+            raise ValueError("intent model doesn't match the feature layout, retrain it")
+
+    @staticmethod
+    def n_features() -> int:
+        return len(DENSE_FEATURES) + HASH_BUCKETS
+
+    @classmethod
+    def load(cls, path: str, topic_patterns: list, anchor_patterns: list):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("features") != DENSE_FEATURES or data.get("hash_buckets") != HASH_BUCKETS:
+            raise ValueError(f"{path} was trained with a different feature layout, retrain it")
+        return cls(data["weights"], data["bias"], topic_patterns, anchor_patterns,
+                   data.get("threshold", 0.5))
+
+    def save(self, path: str, meta: dict | None = None):
+        data = {
+            "features": DENSE_FEATURES,
+            "hash_buckets": HASH_BUCKETS,
+            "threshold": self.threshold,
+            "bias": round(self.bias, 6),
+            "weights": [round(float(w), 6) for w in self.weights],
+        }
+        if meta:
+            data["meta"] = meta
+        with open(path, "w") as f:
+            json.dump(data, f, indent=1)
+            f.write("\n")
+
+    def features(self, prompt: str, entities: list[dict]) -> np.ndarray:
+        """one row per entity, entities need text / label and ideally start / end"""
+        return _features(prompt, entities, self.topic_patterns, self.anchor_patterns)
+
+    def predict_proba(self, prompt: str, entities: list[dict]) -> np.ndarray:
+        """P(task) for every entity, 0 for labels intent never touches"""
+        if not entities:
+            return np.zeros(0)
+        x = self.features(prompt, entities)
+        proba = 1.0 / (1.0 + np.exp(-(x @ self.weights + self.bias)))
+        eligible = np.array([e["label"].lower() in LABELS for e in entities])
+        return np.where(eligible, proba, 0.0)
+
+    def classify(self, prompt: str, entities: list[dict]) -> dict:
+        """same shape as IntentClassifier.classify: {"task": [...], "identity": [...]}"""
+        proba = self.predict_proba(prompt, entities)
+        return {
+            "task": [e["text"] for e, p in zip(entities, proba) if p >= self.threshold],
+            "identity": [e["text"] for e, p in zip(entities, proba) if p < self.threshold],
+        }
+
+    @classmethod
+    def train(cls, examples: list, topic_patterns: list, anchor_patterns: list,
+              epochs: int = 300, lr: float = 0.5, l2: float = 0.03):
+        """
+        full-batch gradient descent on the log loss, classes weighted so the
+        few task examples count as much as the many identity ones.
+        examples = [(prompt, entities, y)], y[i] = 1 if entities[i] is task
+        """
+        x = np.vstack([_features(p, ents, topic_patterns, anchor_patterns) for p, ents, _ in examples])
+        y = np.concatenate([np.asarray(ys, dtype=np.float64) for _, _, ys in examples])
+        pos = max(y.sum(), 1.0)
+        neg = max(len(y) - y.sum(), 1.0)
+        sample_w = np.where(y == 1, len(y) / (2 * pos), len(y) / (2 * neg))
+
+        w = np.zeros(x.shape[1])
+        b = 0.0
+        for _ in range(epochs):
+            p = 1.0 / (1.0 + np.exp(-(x @ w + b)))
+            err = (p - y) * sample_w
+            w -= lr * (x.T @ err / len(y) + l2 * w)
+            b -= lr * err.mean()
+        return cls(w, b, topic_patterns, anchor_patterns)
+
+
+def _features(prompt, entities, topic_patterns, anchor_patterns):
+    x = np.zeros((len(entities), IntentModel.n_features()))
+    if not entities:
+        return x
+    lower = prompt.lower()
+
+    # once per prompt
+    topic_hits = sum(1 for p in topic_patterns if p.search(prompt))
+    anchor_ends = [np.array([m.end() for m in p.finditer(prompt)], dtype=np.int64) for p in anchor_patterns]
+
+    starts = np.empty(len(entities), dtype=np.int64)
+    ends = np.empty(len(entities), dtype=np.int64)
+    for i, e in enumerate(entities):
+        start = e.get("start")
+        if start is None:
+            start = max(lower.find(e["text"].lower()), 0)
+        starts[i] = start
+        ends[i] = e.get("end", start + len(e["text"]))
+
+    # anchor proximity for all entities at once: 1 right after the anchor,
+    # falling to 0 at ANCHOR_WINDOW chars back
+    col = DENSE_FEATURES.index("anchor:residence")
+    for g, anchor in enumerate(anchor_ends):
+        if not len(anchor):
+            continue
+        gap = starts[:, None] - anchor[None, :]
+        gap = np.where(gap >= 0, gap, ANCHOR_WINDOW + 1).min(axis=1)
+        x[:, col + g] = np.clip(1.0 - gap / ANCHOR_WINDOW, 0.0, 1.0)
+
+    x[:, DENSE_FEATURES.index("topic")] = 1.0 if topic_hits else 0.0
+    x[:, DENSE_FEATURES.index("topic_hits")] = topic_hits / max(len(topic_patterns), 1)
+    x[:, DENSE_FEATURES.index("position")] = starts / max(len(prompt), 1)
+
+    near_col = DENSE_FEATURES.index("first_person_near")
+    for i, e in enumerate(entities):
+        label = e["label"].lower()
+        if label in LABELS:
+            x[i, LABELS.index(label)] = 1.0
+
+        start, end = starts[i], ends[i]
+        before = prompt[max(0, start - NEAR_CHARS):start]
+        x[i, near_col] = 1.0 if _FIRST_PERSON.search(before) else 0.0
+
+        s_start, s_end = _sentence_bounds(prompt, start, end)
+        sentence = prompt[s_start:s_end]
+        x[i, near_col + 1] = 1.0 if _FIRST_PERSON.search(sentence) else 0.0
+        x[i, near_col + 2] = 1.0 if _inside_quotes(prompt, start) else 0.0
+        x[i, near_col + 3] = 1.0 if prompt[s_end:s_end + 1] == "?" else 0.0
+
+        left = _WORD.findall(lower[max(0, start - 60):start])[-LEFT_WORDS:]
+        right = _WORD.findall(lower[end:end + 40])[:RIGHT_WORDS]
+        tokens = [f"L:{t}" for t in left] + [f"R:{t}" for t in right]
+        if left:
+            tokens.append(f"L1:{left[-1]}")
+        for t in tokens:
+            x[i, _bucket(t)] += 1.0
+    return x
+
+
+def _inside_quotes(text, pos):
+    return len(_QUOTE.findall(text, 0, pos)) % 2 == 1
+
+
+def _sentence_bounds(text, start, end):
+    s_start = start
+    while s_start > 0 and not _SENTENCE_END.match(text[s_start - 1]):
+        s_start -= 1
+    m = _SENTENCE_END.search(text, end)
+    return s_start, m.start() if m else len(text)
+
+
+def load_examples(labels_path: str = LABELS_PATH, data_files: list[str] | None = None) -> list:
+    """
+    [(prompt_id, prompt, entities, y)] from the labelled prompts. every
+    mention of a labelled text is an entity, except mentions inside a longer
+    labelled one ("Noida" in "DPS Noida") - dedup would drop those anyway
+    """
+    with open(labels_path) as f:
+        labels = json.load(f)["labels"]
+
+    prompts = {}
+    for path in data_files or DATA_FILES:
+        with open(path) as f:
+            data = json.load(f)
+        _collect_prompts(data, prompts)
+
+    examples = []
+    for prompt_id, entity_labels in labels.items():
+        prompt = prompts[prompt_id]
+        found = []
+        for text, (label, intent) in entity_labels.items():
+            for m in re.finditer(r"\b" + re.escape(text) + r"\b", prompt):
+                found.append({"text": text, "label": label, "start": m.start(), "end": m.end(),
+                              "y": 1 if intent == "task" else 0})
+        found = [e for e in found if not any(
+            o is not e and o["start"] <= e["start"] and e["end"] <= o["end"] and o["end"] - o["start"] > e["end"] - e["start"]
+            for o in found
+        )]
+        found.sort(key=lambda e: e["start"])
+        y = [e.pop("y") for e in found]
+        examples.append((prompt_id, prompt, found, y))
+    return examples
+
+
+def _collect_prompts(obj, out):
+    if isinstance(obj, dict):
+        if "id" in obj and isinstance(obj.get("prompt"), str):
+            out[obj["id"]] = obj["prompt"]
+        for v in obj.values():
+            _collect_prompts(v, out)
+    elif isinstance(obj, list):
+        for v in obj:
+            _collect_prompts(v, out)
+
+
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, os.path.dirname(HERE))
+    from core.entity_classifier import EntityClassifier
+
+    examples = load_examples()
+    model = IntentModel.train(
+        [(p, ents, y) for _, p, ents, y in examples],
+        EntityClassifier.TOPIC_PATTERNS, EntityClassifier.IDENTITY_ANCHORS,
+    )
+    n = sum(len(y) for *_, y in examples)
+    task = sum(sum(y) for *_, y in examples)
+    correct = sum(
+        int((proba >= model.threshold) == bool(label))
+        for _, p, ents, y in examples
+        for proba, label in zip(model.predict_proba(p, ents), y)
+    )
+    model.save(INTENT_MODEL_PATH, {"prompts": len(examples), "entities": n, "task": task})
+    print(f"trained on {n} entities ({task} task) from {len(examples)} prompts, "
+          f"train accuracy {correct / n:.1%} -> {INTENT_MODEL_PATH}")
+    print("cross-validated numbers vs the heuristics / LLM: python bench_intent.py")
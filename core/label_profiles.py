@@ -0,0 +1,83 @@
+"""
+label_profiles.py - smaller GLiNER label sets per domain
+
+GLiNER gets slower the more labels it has to score, and most prompts
+only need a few. every profile keeps all the identity + structural
+labels (those are the privacy part), profiles only differ in which
+domain-critical PRESERVE labels they ask for.
+
+"full" is the original 18-label list.
+"""
+
+import re
+
+try:
+    from .entity_classifier import EntityClassifier
+except ImportError:
+    from entity_classifier import EntityClassifier
+
+
+# never dropped - these are what actually gets replaced / perturbed
+BASE_LABELS = [
+    "person", "organization", "location",
+    "email address", "phone number",
+    "project name", "product name",
+    "government id",
+    "date", "money amount",
+]
+
+PROFILES = {
+    "general": BASE_LABELS + ["job title"],
+    "medical": BASE_LABELS + ["medical condition", "drug name", "symptom", "medical procedure", "job title"],
+    "legal": BASE_LABELS + ["legal concept", "regulatory term", "job title"],
+    "finance": BASE_LABELS + ["financial instrument", "regulatory term", "job title"],
+    "full": BASE_LABELS + [
+        "medical condition", "drug name",
+        "symptom", "medical procedure",
+        "legal concept", "financial instrument",
+        "regulatory term", "job title",
+    ],
+}
+
+# cheap keyword signals for picking a profile when nobody chose one
+KEYWORDS = {
+    "medical": re.compile(
+        r'\b(?:doctor|dr\.?|patient|hospital|clinic|diagnos\w*|symptoms?|prescri\w*|medication|'
+        r'medicine|dose|dosage|mg|surgery|treatment|therapy|disease|disorder|syndrome|diabetes|'
+        r'cancer|blood|pain|infection|allerg\w*|pregnan\w*|nurse|pharmacy|insulin|vaccine)\b', re.I
+    ),
+    "legal": re.compile(
+        r'\b(?:lawyer|attorney|advocate|court|judge|lawsuit|sued|contract|clause|agreement|'
+        r'liabilit\w*|plaintiff|defendant|litigation|statute|nda|custody|divorce|'
+        r'lease|tenant|landlord|visa|immigration|compliance|gdpr|hipaa|affidavit|probate)\b', re.I
+    ),
+    "finance": re.compile(
+        r'\b(?:invest\w*|stocks?|bonds?|mutual funds?|etf|portfolio|loan|mortgage|emi|'
+        r'interest rate|credit|debit|tax\w*|ira|401k|sip|equity|dividend|ipo|crypto\w*|bitcoin|'
+        r'insurance|revenue|valuation|funding|salary|budget|bank\w*|fd|ppf|nps)\b', re.I
+    ),
+}
+
+DEFAULT_PROFILE = "general"
+
+# catch typos in the lists above early
+for _name, _labels in PROFILES.items():
+    _unknown = [l for l in _labels if l not in EntityClassifier.TIER_MAP]
+    assert not _unknown, f"profile {_name} has labels with no tier: {_unknown}"
+
+
+def pick_profile(text: str) -> str:
+    """guess a profile from keywords. one domain -> that profile, several -> full"""
+    hits = [name for name, pattern in KEYWORDS.items() if pattern.search(text)]
+    if not hits:
+        return DEFAULT_PROFILE
+    if len(hits) == 1:
+        return hits[0]
+    return "full"
+
+
+def profile_labels(name: str) -> list[str]:
+    if name not in PROFILES:
+        raise ValueError(f"unknown label profile {name!r}, pick one of {list(PROFILES)}")
+    return PROFILES[name]
+
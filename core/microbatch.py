@@ -0,0 +1,123 @@
+"""
+microbatch.py - coalesces concurrent NER calls into one batch
+
+when a few /chat requests land at the same time each one used to run
+its own predict_entities. MicroBatcher sits in front of the model and
+holds requests for a short window (max_wait_ms, or until max_batch
+texts are queued), runs them as one batch_predict_entities call and
+hands every caller its own result.
+
+it exposes the same predict_entities / batch_predict_entities as a
+GLiNER model, so the sanitizer just uses it as its model.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class _Item:
+    __slots__ = ("text", "labels", "threshold", "future", "enqueued")
+
+    def __init__(self, text, labels, threshold):
+        self.text = text
+        self.labels = tuple(labels)
+        self.threshold = threshold
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class MicroBatcher:
+
+    def __init__(self, model, max_wait_ms: float = 5.0, max_batch: int = 16):
+        self.model = model
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+
+        # stats
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.total_wait = 0.0
+        self.max_wait_seen = 0.0
+
+        self._thread = threading.Thread(target=self._loop, name="ner-microbatch", daemon=True)
+        self._thread.start()
+
+    # --- same interface as GLiNER ---
+
+    def predict_entities(self, text, labels, threshold=0.5, **kwargs):
+        return self._submit(text, labels, threshold).result()
+
+    def batch_predict_entities(self, texts, labels, threshold=0.5, batch_size=8, **kwargs):
+        futures = [self._submit(t, labels, threshold) for t in texts]
+        return [f.result() for f in futures]
+
+    def _submit(self, text, labels, threshold):
+        item = _Item(text, labels, threshold)
+        self._queue.put(item)
+        return item.future
+
+    # --- scheduler ---
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            # the window starts when the oldest request arrived, so nobody waits more than max_wait
+            deadline = first.enqueued + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run(batch)
+
+    def _run(self, batch):
+        started = time.perf_counter()
+        waits = [started - item.enqueued for item in batch]
+
+        # one model call per (labels, threshold) combo, usually there's just one
+        groups = {}
+        for item in batch:
+            groups.setdefault((item.labels, item.threshold), []).append(item)
+
+        for (labels, threshold), items in groups.items():
+            try:
+                if len(items) == 1:
+                    results = [self.model.predict_entities(items[0].text, list(labels), threshold=threshold)]
+                else:
+                    results = self.model.batch_predict_entities(
+                        [i.text for i in items], list(labels), threshold=threshold, batch_size=len(items)
+                    )
+                for item, result in zip(items, results):
+                    item.future.set_result(result)
+            except Exception as e:
+                for item in items:
+                    item.future.set_exception(e)
+
+        with self._stats_lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self.total_wait += sum(waits)
+            self.max_wait_seen = max(self.max_wait_seen, max(waits))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "max_wait_ms": self.max_wait * 1000,
+                "max_batch": self.max_batch,
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": self.max_batch_seen,
+                "avg_queue_wait_ms": round(self.total_wait / self.items * 1000, 3) if self.items else 0.0,
+                "max_queue_wait_ms": round(self.max_wait_seen * 1000, 3),
+            }
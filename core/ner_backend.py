@@ -0,0 +1,126 @@
+"""
+ner_backend.py - picks how GLiNER actually runs on the box
+
+  torch       - plain pytorch eager, full precision (the original path)
+  torch_int8  - same model with Linear layers dynamically quantized to int8
+  onnx        - model exported to ONNX and run with onnxruntime
+  onnx_int8   - the ONNX export, dynamically quantized to int8
+  remote      - no model in this process, talks to ner_service.py over a unix socket
+
+all of them hand back something with GLiNER's predict_entities /
+batch_predict_entities, so the sanitizer doesn't care which one it got.
+onnx needs `pip install onnx onnxruntime`, the export happens once
+and is reused from MODEL_DIR after that.
+"""
+
+import os
+
+
+MODEL_ID = "urchade/gliner_medium-v2.1"
+MODEL_DIR = os.getenv("SP_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+
+BACKENDS = ("torch", "torch_int8", "onnx", "onnx_int8", "remote")
+
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model_quantized.onnx"
+
+
+def load_ner_model(backend: str = "torch", model_id: str = MODEL_ID):
+    """load GLiNER for the given backend"""
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown NER backend {backend!r}, pick one of {BACKENDS}")
+
+    if backend == "remote":
+        # gliner/torch never get imported in this process
+        try:
+            from .ner_service import RemoteNER
+        except ImportError:
+            from ner_service import RemoteNER
+        return RemoteNER()
+
+    from gliner import GLiNER
+
+    if backend == "torch":
+        return GLiNER.from_pretrained(model_id)
+
+    if backend == "torch_int8":
+        import torch
+
+        model = GLiNER.from_pretrained(model_id)
+        model.model = torch.quantization.quantize_dynamic(
+            model.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        model.eval()
+        return model
+
+    onnx_dir = _onnx_dir(model_id)
+    onnx_file = ONNX_INT8_FILE if backend == "onnx_int8" else ONNX_FILE
+    if not os.path.exists(os.path.join(onnx_dir, onnx_file)):
+        export_onnx(model_id, quantize=(backend == "onnx_int8"))
+
+    return GLiNER.from_pretrained(
+        onnx_dir, load_onnx_model=True, load_tokenizer=True, onnx_model_file=onnx_file
+    )
+
+
+def export_onnx(model_id: str = MODEL_ID, quantize: bool = True) -> str:
+    """
+    export GLiNER to ONNX (plus an int8 copy if quantize) under MODEL_DIR.
+    same recipe as gliner's own convert_to_onnx script. returns the dir
+    """
+    import torch
+    from gliner import GLiNER
+
+    out_dir = _onnx_dir(model_id)
+    os.makedirs(out_dir, exist_ok=True)
+    onnx_path = os.path.join(out_dir, ONNX_FILE)
+
+    if not os.path.exists(onnx_path):
+        print(f"[ner] exporting {model_id} to ONNX, one-time thing...")
+        model = GLiNER.from_pretrained(model_id, load_tokenizer=True)
+        # config + tokenizer go next to the .onnx so from_pretrained can load the dir
+        model.save_pretrained(out_dir)
+
+        text = "Tim Cook met Sundar Pichai in Cupertino on January 15, 2026."
+        inputs, _ = model.prepare_model_inputs([text], ["person", "location", "date"])
+
+        input_names = ["input_ids", "attention_mask", "words_mask", "text_lengths"]
+        dynamic_axes = {
+            "input_ids": {0: "batch_size", 1: "sequence_length"},
+            "attention_mask": {0: "batch_size", 1: "sequence_length"},
+            "words_mask": {0: "batch_size", 1: "sequence_length"},
+            "text_lengths": {0: "batch_size", 1: "value"},
+            "logits": {0: "position", 1: "batch_size", 2: "num_spans", 3: "num_classes"},
+        }
+        if model.config.span_mode != "token_level":
+            input_names += ["span_idx", "span_mask"]
+            dynamic_axes["span_idx"] = {0: "batch_size", 1: "num_spans", 2: "idx"}
+            dynamic_axes["span_mask"] = {0: "batch_size", 1: "num_spans"}
+
+        torch.onnx.export(
+            model.model,
+            tuple(inputs[name] for name in input_names),
+            f=onnx_path,
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+
+    int8_path = os.path.join(out_dir, ONNX_INT8_FILE)
+    if quantize and not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        print("[ner] quantizing ONNX model to int8...")
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+
+    return out_dir
+
+
+def _onnx_dir(model_id):
+    return os.path.join(MODEL_DIR, model_id.replace("/", "__") + "-onnx")
+
+
+if __name__ == "__main__":
+    # python ner_backend.py  -> pre-export so the first request doesnt pay for it
+    print(f"exported to {export_onnx()}")
@@ -0,0 +1,157 @@
+"""
+ner_gate.py - cheap check that runs before GLiNER
+
+a lot of prompts ("explain recursion", "write a haiku about rain")
+have nothing for NER to find: no names, orgs, places, dates, money.
+if none of the usual cues show up we can skip the model for them.
+
+it only ever says "skip" when it's sure - anything that looks like
+a proper noun, a number with meaning, non-latin script, a regex or
+gazetteer hit, or an identity phrase ("i live", "based in", "from")
+sends the prompt through NER like before. people type names in
+lowercase ("tell john that sarah is sick"), so on top of that every
+word has to be in common_words.txt
+"""
+
+import os
+import re
+
+try:
+    from .entity_classifier import EntityClassifier
+except ImportError:
+    from entity_classifier import EntityClassifier
+
+
+# long prompts always go through, too much room for a name to hide
+MAX_CHARS = 500
+
+# more digits than this (as a share of non-space chars) = probably dates/ids/amounts
+MAX_DIGIT_RATIO = 0.05
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z'\-]*")
+_SENTENCE_BREAK = re.compile(r'[.!?:;]\s+|\n')
+_MONEY_OR_PCT = re.compile(r'[$€£¥₹%]|\d+\s*(?:k|m|bn|lakh|crore|million|billion|percent)\b', re.I)
+_LONG_NUMBER = re.compile(r'\d{4,}|\d+[/-]\d+')
+_MONTHS_DAYS = re.compile(
+    r'\b(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|'
+    r'sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?|monday|tuesday|wednesday|'
+    r'thursday|friday|saturday|sunday|yesterday|tomorrow|today|tonight)\b', re.I
+)
+
+# people type names in lowercase too ("my friend john") - these phrases mean a name is likely
+_PERSON_CUES = re.compile(
+    r"\b(?:my (?:name|friend|boss|manager|colleague|coworker|wife|husband|partner|son|daughter|"
+    r"mom|mum|dad|brother|sister|doctor|neighbou?r|landlord|client)|named|called|call me|i am|i'm|im)\b",
+    re.I,
+)
+
+COMMON_WORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "common_words.txt")
+
+
+def _load_words(path):
+    with open(path, encoding="utf-8") as f:
+        return frozenset(w.lower() for line in f for w in line.split("#", 1)[0].split())
+
+
+COMMON_WORDS = _load_words(COMMON_WORDS_PATH)
+
+# "i live in", "based in", "my office", "from" - whatever comes next is who / where the user is
+_IDENTITY_ANCHORS = EntityClassifier.IDENTITY_ANCHORS
+
+# capitalized only because they start a sentence, not because they're names
+_COMMON_STARTERS = {
+    "a", "an", "the", "i", "im", "i'm", "i'd", "i've", "i'll", "my", "me", "we", "our", "you", "your",
+    "it", "its", "it's", "this", "that", "these", "those", "there", "here",
+    "what", "whats", "what's", "why", "how", "when", "where", "which", "who", "whom", "whose",
+    "is", "are", "was", "were", "be", "do", "does", "did", "can", "could", "would", "should",
+    "will", "shall", "may", "might", "must", "have", "has", "had",
+    "please", "pls", "hey", "hi", "hello", "thanks", "thank", "ok", "okay", "so", "and", "but",
+    "or", "if", "then", "also", "now", "just", "only", "yes", "no", "not", "any", "some", "all",
+    "explain", "describe", "write", "give", "tell", "show", "list", "make", "create", "generate",
+    "summarize", "summarise", "translate", "rewrite", "fix", "help", "find", "compare", "suggest",
+    "recommend", "define", "convert", "calculate", "solve", "draft", "compose", "outline", "design",
+    "implement", "debug", "review", "improve", "plan", "teach", "let", "let's", "lets", "imagine",
+    "pretend", "act", "continue", "try", "use", "add", "remove", "sort", "count", "name",
+    "in", "on", "for", "with", "about", "from", "to", "of", "at", "by", "after", "before",
+    "one", "two", "three", "first", "second", "next", "last", "best", "top", "more",
+}
+
+
+def _is_common(word, vocab=COMMON_WORDS):
+    """word or a regular form of one (cafes, asked, running, quickly) is in vocab"""
+    word = word.lower().strip("'-")
+    if not word or word in vocab:
+        return True
+    if "-" in word:
+        return all(_is_common(part, vocab) for part in word.split("-"))
+    stem, _, suffix = word.partition("'")
+    if suffix in ("s", "re", "ve", "ll", "d", "m", "t"):
+        return stem in vocab
+    candidates = []
+    if word.endswith("ies"):
+        candidates.append(word[:-3] + "y")
+    if word.endswith("s"):
+        candidates.append(word[:-1])
+    if word.endswith("es"):
+        candidates.append(word[:-2])
+    for suffix in ("ed", "ing", "er", "ly"):
+        if word.endswith(suffix):
+            candidates += [word[:-len(suffix)], word[:-len(suffix)] + "e"]
+    return any(c in vocab for c in candidates if len(c) > 2)
+
+
+class NERGate:
+
+    def __init__(self, gazetteer=None):
+        # gazetteer: EntityClassifier.gazetteer, a listed name anywhere
+        # (whitelisted cities / orgs too, in any case) means NER runs
+        self.gazetteer = gazetteer
+
+    def check(self, text: str, regex_entities: list[dict]) -> tuple[bool, str]:
+        """
+        returns (skip, reason). skip=True means NER can't find anything here.
+        reason names the cue that forced NER, or "no_cues" when skipping
+        """
+        if regex_entities:
+            return False, "regex_hit"
+        if len(text) > MAX_CHARS:
+            return False, "long_text"
+        if any(ch.isalpha() and not ch.isascii() for ch in text):
+            return False, "non_latin"
+
+        if _PERSON_CUES.search(text):
+            return False, "person_cue"
+        if any(p.search(text) for p in _IDENTITY_ANCHORS):
+            return False, "identity_anchor"
+        if self.gazetteer is not None and self.gazetteer.scan(text):
+            return False, "gazetteer_hit"
+        if _MONEY_OR_PCT.search(text):
+            return False, "money_or_percent"
+        if _LONG_NUMBER.search(text) or _MONTHS_DAYS.search(text):
+            return False, "date_or_number"
+        chars = sum(1 for ch in text if not ch.isspace())
+        digits = sum(1 for ch in text if ch.isdigit())
+        if chars and digits / chars > MAX_DIGIT_RATIO:
+            return False, "digit_density"
+
+        # proper noun cues: capitals anywhere except a plain sentence starter
+        for sentence in _SENTENCE_BREAK.split(text):
+            for i, m in enumerate(_WORD.finditer(sentence)):
+                word = m.group()
+                if not any(ch.isupper() for ch in word):
+                    continue
+                if word.isupper() and len(word) > 1:
+                    return False, f"acronym:{word}"
+                if i == 0 and word.lower() in _COMMON_STARTERS and word[1:].islower():
+                    continue
+                if word == "I" or word.startswith("I'"):
+                    continue
+                return False, f"proper_noun:{word}"
+
+        # lowercase names / places look like any other word, so only skip
+        # when we know every word
+        for m in _WORD.finditer(text):
+            if not _is_common(m.group()):
+                return False, f"uncommon_word:{m.group()}"
+
+        return True, "no_cues"
@@ -0,0 +1,212 @@
+"""
+ner_service.py - GLiNER in its own pool of processes
+
+every uvicorn worker used to load its own copy of the model. instead
+run this once per box:
+
+    python -m core.ner_service --workers 2 --backend torch_int8
+
+and start the API with SP_NER_BACKEND=remote (SP_NER_SOCKET if the
+socket isn't at the default path). each pool process holds
+one model, API workers talk to the pool over a unix socket, so API
+workers and inference workers scale separately.
+
+protocol: every message is a 4-byte big-endian length + a JSON body
+  request:  {"texts": [...], "labels": [...], "threshold": 0.6, "batch_size": 8}
+  response: {"ok": true, "results": [[entity, ...], ...]}
+            {"ok": false, "error": "..."}
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import socketserver
+import struct
+import threading
+
+
+SOCKET_PATH = os.getenv("SP_NER_SOCKET", "/tmp/silent_protocol_ner.sock")
+TIMEOUT = 60  # seconds, a big batch of long windows can take a while on CPU
+
+_HEADER = struct.Struct(">I")
+MAX_MESSAGE = 64 * 1024 * 1024
+
+
+# --- framing ---
+
+def send_message(sock, obj):
+    body = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(body)) + body)
+
+
+def recv_message(sock):
+    """next message, or None if the other side hung up"""
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    (length,) = _HEADER.unpack(header)
+    if length > MAX_MESSAGE:
+        raise ValueError(f"message too big: {length} bytes")
+    body = _recv_exactly(sock, length)
+    if body is None:
+        raise ConnectionError("connection closed mid-message")
+    return json.loads(body)
+
+
+def _recv_exactly(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            if buf:
+                raise ConnectionError("connection closed mid-message")
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+# --- client side (lives in the API workers) ---
+
+class RemoteNER:
+    """
+    drop-in for a GLiNER model that forwards to the service.
+    one connection per thread, reconnects once if the service restarted
+    """
+
+    def __init__(self, socket_path: str = SOCKET_PATH, timeout: float = TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def predict_entities(self, text, labels, threshold=0.5, **kwargs):
+        return self.batch_predict_entities([text], labels, threshold=threshold)[0]
+
+    def batch_predict_entities(self, texts, labels, threshold=0.5, batch_size=8, **kwargs):
+        request = {"texts": list(texts), "labels": list(labels), "threshold": threshold, "batch_size": batch_size}
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                send_message(sock, request)
+                response = recv_message(sock)
+                if response is None:
+                    raise ConnectionError("ner service closed the connection")
+                break
+            except (ConnectionError, OSError):
+                self._drop_connection()
+                if attempt:
+                    raise
+        if not response.get("ok"):
+            raise RuntimeError(f"ner service error: {response.get('error')}")
+        return response["results"]
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+
+# --- server side ---
+
+_model = None
+
+
+def _init_worker(backend, threads):
+    """runs once in every pool process: load the model it'll keep for its lifetime"""
+    global _model
+    # workers run side by side, so each gets a slice of the cores instead of all of them
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # ctrl-c is the parent's job
+
+    try:
+        from .ner_backend import load_ner_model
+    except ImportError:
+        from ner_backend import load_ner_model
+    _model = load_ner_model(backend)
+    print(f"[ner-service] worker {os.getpid()} loaded {backend}")
+
+
+def _worker_predict(texts, labels, threshold, batch_size):
+    if len(texts) == 1:
+        return [_model.predict_entities(texts[0], labels, threshold=threshold)]
+    return _model.batch_predict_entities(texts, labels, threshold=threshold, batch_size=batch_size)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        # connections stay open, one request at a time per connection
+        while True:
+            try:
+                request = recv_message(self.request)
+            except (ConnectionError, OSError, ValueError):
+                return
+            if request is None:
+                return
+            try:
+                results = self.server.pool.apply(
+                    _worker_predict,
+                    (request["texts"], request["labels"], request.get("threshold", 0.5), request.get("batch_size", 8)),
+                )
+                response = {"ok": True, "results": results}
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            try:
+                send_message(self.request, response)
+            except OSError:
+                return
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path=SOCKET_PATH, workers=2, backend="torch", threads=None):
+    if backend == "remote":
+        raise ValueError("the service needs a real backend, not remote")
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    # spawn, not fork: the server has threads and the workers load torch
+    ctx = multiprocessing.get_context("spawn")
+    pool = ctx.Pool(workers, initializer=_init_worker, initargs=(backend, threads))
+
+    server = _Server(socket_path, _Handler)
+    server.pool = pool
+    print(f"[ner-service] {workers} x {backend} listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.terminate()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="shared GLiNER inference pool")
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--backend", default=os.getenv("SP_NER_SERVICE_BACKEND", "torch"))
+    parser.add_argument("--threads", type=int, default=None, help="torch threads per worker")
+    args = parser.parse_args()
+    serve(args.socket, args.workers, args.backend, args.threads)
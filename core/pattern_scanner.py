@@ -5,6 +5,79 @@ that the NER model usually misses
 """
 
 import re
+from typing import Iterable, Iterator
+
+
+def _combine(patterns, order):
+    """one alternation with a named group per label, in precedence order"""
+    return re.compile("|".join(f"(?P<{label}>{patterns[label].pattern})" for label in order))
+
+
+# --- validators: the regexes only check the shape, these check the digits ---
+
+def _digits(text):
+    return [int(c) for c in text if c.isdigit()]
+
+
+def luhn_ok(text: str) -> bool:
+    """credit cards: every second digit from the right doubled, sum % 10 == 0"""
+    total = 0
+    for i, d in enumerate(reversed(_digits(text))):
+        if i % 2:
+            d *= 2
+            if d > 9:
+                d -= 9
+        total += d
+    return total % 10 == 0
+
+
+# verhoeff tables (dihedral group D5), used by UIDAI for the aadhaar check digit
+_VERHOEFF_D = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9], [1, 2, 3, 4, 0, 6, 7, 8, 9, 5],
+    [2, 3, 4, 0, 1, 7, 8, 9, 5, 6], [3, 4, 0, 1, 2, 8, 9, 5, 6, 7],
+    [4, 0, 1, 2, 3, 9, 5, 6, 7, 8], [5, 9, 8, 7, 6, 0, 4, 3, 2, 1],
+    [6, 5, 9, 8, 7, 1, 0, 4, 3, 2], [7, 6, 5, 9, 8, 2, 1, 0, 4, 3],
+    [8, 7, 6, 5, 9, 3, 2, 1, 0, 4], [9, 8, 7, 6, 5, 4, 3, 2, 1, 0],
+]
+_VERHOEFF_P = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9], [1, 5, 7, 6, 2, 8, 3, 0, 9, 4],
+    [5, 8, 0, 3, 7, 9, 6, 1, 4, 2], [8, 9, 1, 6, 0, 4, 3, 5, 2, 7],
+    [9, 4, 5, 3, 1, 2, 6, 8, 7, 0], [4, 2, 8, 6, 5, 7, 3, 9, 0, 1],
+    [2, 7, 9, 3, 8, 0, 6, 4, 1, 5], [7, 0, 4, 6, 9, 1, 3, 2, 5, 8],
+]
+
+
+def verhoeff_ok(text: str) -> bool:
+    """aadhaar: verhoeff checksum over all 12 digits, and it never starts with 0 or 1"""
+    digits = _digits(text)
+    if not digits or digits[0] < 2:
+        return False
+    check = 0
+    for i, d in enumerate(reversed(digits)):
+        check = _VERHOEFF_D[check][_VERHOEFF_P[i % 8][d]]
+    return check == 0
+
+
+def ip_ok(text: str) -> bool:
+    """four octets 0-255, no leading zeros (those are version strings / ids, not IPs)"""
+    for octet in text.split("."):
+        if int(octet) > 255 or (len(octet) > 1 and octet[0] == "0"):
+            return False
+    return True
+
+
+def ssn_ok(text: str) -> bool:
+    """
+    SSA never issues area 000 / 666, group 00 or serial 0000.
+    9xx areas are ITINs - still a tax id, so they pass
+    """
+    area, group, serial = text.split("-")
+    return area not in ("000", "666") and group != "00" and serial != "0000"
+
+
+def pan_ok(text: str) -> bool:
+    """4th char of a PAN is the holder type (P person, C company, H HUF ...)"""
+    return text[3] in "ABCFGHJLPT"
 
 
 class PatternScanner:
@@ -31,16 +104,168 @@ class PatternScanner:
         "phone_in": re.compile(r'(?:\+91[\s.-]?)[6-9]\d{4}[\s.-]?\d{5}'),
     }
 
+    # if two patterns match at the same position the earlier one here wins.
+    # specific formats first, phone is the catch-all for digit runs so it goes late
+    PRECEDENCE = [
+        "email", "url",
+        "credit_card", "aadhaar", "ssn", "ip_address",
+        "phone_in", "phone",
+        "pan_card",
+    ]
+
+    VALIDATORS = {
+        "credit_card": luhn_ok,
+        "aadhaar": verhoeff_ok,
+        "ip_address": ip_ok,
+        "ssn": ssn_ok,
+        "pan_card": pan_ok,
+    }
+
+    # per label: "strict" drops matches that fail their validator, "lenient"
+    # keeps them tagged valid=False, "off" skips the check. aadhaar is lenient
+    # because plenty of the aadhaar numbers people paste are made up / typo'd
+    # and we'd still rather replace them
+    VALIDATION = {
+        "credit_card": "strict",
+        "aadhaar": "lenient",
+        "ip_address": "strict",
+        "ssn": "strict",
+        "pan_card": "strict",
+    }
+
+    # all of PATTERNS as one regex -> one pass over the text
+    _COMBINED = _combine(PATTERNS, PRECEDENCE)
+
+    # every pattern above has at least one of these chars in it (a digit, the
+    # @ of an email, the : of a url), so we only try to match near them and
+    # skip plain prose at C speed. a match starts at the trigger, up to 5 chars
+    # before it (https:, the letters of a PAN) or at the start of the email-ish
+    # run of chars it sits in. adding a pattern without any of these = update this
+    _TRIGGER = re.compile(r'[0-9+(@:]')
+    _EMAIL_CHAR = re.compile(r'[\w.+-]')
+    _EMAIL_RUN = re.compile(r'[\w.+-]*')
+
+    # scan_stream holds back this many chars at the end of each chunk, since a
+    # match starting there might continue in the next one. also the longest
+    # match it's guaranteed to get right (urls / emails longer than this that
+    # straddle a chunk boundary can come out split)
+    STREAM_TAIL = 512
+
+    def __init__(self, validation: dict | None = None):
+        # validation: overrides for VALIDATION, e.g. {"aadhaar": "strict"}
+        self.validation = {**self.VALIDATION, **(validation or {})}
+        for label, mode in self.validation.items():
+            if mode not in ("strict", "lenient", "off"):
+                raise ValueError(f"validation for {label} must be strict / lenient / off, got {mode!r}")
+
     def scan(self, text: str) -> list[dict]:
-        """scan text for all patterns, returns list of matches"""
+        """
+        scan text for all patterns in a single pass, returns non-overlapping
+        matches in text order. leftmost match wins, ties go by PRECEDENCE.
+        a strict match that fails its checksum is dropped along with its
+        span, so an invalid card number doesn't come back as a phone number
+        """
         entities = []
-        for label, pattern in self.PATTERNS.items():
-            for match in pattern.finditer(text):
-                entities.append({
-                    "text": match.group(),
-                    "label": label,
-                    "start": match.start(),
-                    "end": match.end(),
-                    "source": "regex",
-                })
+        for match in self._iter_matches(text):
+            entity = self._to_entity(match)
+            if entity is not None:
+                entities.append(entity)
         return entities
+
+    def scan_stream(self, chunks: Iterable[str]) -> Iterator[dict]:
+        """
+        same entities as scan("".join(chunks)), but for text that arrives in
+        pieces (file / socket reads). yields entities with offsets into the
+        whole stream as soon as they're settled, memory stays around one
+        chunk + STREAM_TAIL
+        """
+        buf = ""
+        base = 0  # stream offset of buf[0]
+        pos = 0   # where scanning resumes in buf, everything before it is settled
+        chunks = iter(chunks)
+        final = False
+
+        while not final:
+            chunk = next(chunks, None)
+            if chunk is None:
+                final = True
+            else:
+                buf += chunk
+            limit = len(buf) if final else len(buf) - self.STREAM_TAIL
+            if limit <= pos:
+                continue
+
+            held = None
+            for match in self._iter_matches(buf, pos):
+                # starts in the tail, or runs right up to the end of what we have:
+                # might look different once the next chunk is here
+                if not final and (match.start() >= limit or match.end() >= len(buf)):
+                    held = match.start()
+                    break
+                entity = self._to_entity(match, base)
+                if entity is not None:
+                    yield entity
+                pos = match.end()
+
+            # nothing can start before keep any more. never past limit unless a
+            # settled match took us there: a held match (the digits of
+            # john.smith555...) can still grow leftwards into the tail once
+            # the rest arrives (the @example.com). one char before keep stays
+            # so \b at the new start still sees what came before
+            settled = max(pos, limit)
+            keep = settled if held is None else min(held, settled)
+            cut = max(keep - 1, 0)
+            buf = buf[cut:]
+            base += cut
+            pos = keep - cut
+
+    def _to_entity(self, match, offset=0):
+        label = match.lastgroup
+        entity = {
+            "text": match.group(),
+            "label": label,
+            "start": match.start() + offset,
+            "end": match.end() + offset,
+            "source": "regex",
+        }
+        mode = self.validation.get(label, "off")
+        if mode != "off" and label in self.VALIDATORS:
+            valid = self.VALIDATORS[label](entity["text"])
+            if not valid and mode == "strict":
+                return None
+            entity["valid"] = valid
+        return entity
+
+    def _iter_matches(self, text, pos=0):
+        """same matches as _COMBINED.finditer(text, pos), only tried next to trigger chars"""
+        search_from = pos
+        last_trigger, last_run_start = -1, 0
+
+        while True:
+            trigger = self._TRIGGER.search(text, search_from)
+            if trigger is None:
+                return
+            t = trigger.start()
+
+            # start of the [\w.+-] run t sits in (an email's local part),
+            # reused while we're still inside the same run
+            if last_trigger >= pos and self._EMAIL_RUN.fullmatch(text, last_trigger, t):
+                run_start = last_run_start
+            else:
+                run_start = t
+                while run_start > pos and self._EMAIL_CHAR.match(text, run_start - 1):
+                    run_start -= 1
+            last_trigger, last_run_start = t, run_start
+
+            match = None
+            for start in sorted({run_start, t - 5, t - 4, t}):
+                if pos <= start <= t:
+                    match = self._COMBINED.match(text, start)
+                    if match:
+                        break
+
+            if match:
+                yield match
+                pos = search_from = match.end()
+            else:
+                search_from = t + 1
@@ -3,79 +3,401 @@ sanitiser.py - main pipeline that ties everything together
 regex -> NER -> classify -> intent -> score -> replace
 """
 
-from gliner import GLiNER
+import asyncio
+import threading
+import time
 
 try:
     from .alias_manager import AliasManager
     from .pattern_scanner import PatternScanner
-    from .entity_classifier import EntityClassifier
+    from .entity_classifier import INTENT_SOURCE, EntityClassifier
+    from .text_windows import make_windows, merge_window_entities, split_sentences
+    from .ner_backend import MODEL_ID, load_ner_model
+    from .cache import TieredCache
+    from .ner_gate import NERGate
+    from .label_profiles import PROFILES, pick_profile, profile_labels
+    from .microbatch import MicroBatcher
 except ImportError:
     from alias_manager import AliasManager
     from pattern_scanner import PatternScanner
-    from entity_classifier import EntityClassifier
+    from entity_classifier import INTENT_SOURCE, EntityClassifier
+    from text_windows import make_windows, merge_window_entities, split_sentences
+    from ner_backend import MODEL_ID, load_ner_model
+    from cache import TieredCache
+    from ner_gate import NERGate
+    from label_profiles import PROFILES, pick_profile, profile_labels
+    from microbatch import MicroBatcher
 
 
 class Sanitizer:
-    def __init__(self):
-        self.model = GLiNER.from_pretrained("urchade/gliner_medium-v2.1")
+
+    # labels we want GLiNER to look for - all 18, identity / structural / domain-critical.
+    # profiles in label_profiles.py ask for subsets of this
+    LABELS = PROFILES["full"]
+    THRESHOLD = 0.6
+
+    # covers every stage: regex, all NER labels, intent (LLM init), faker, perturb, desanitize
+    WARMUP_PROMPTS = [
+        "Dr. Priya Sharma from Infosys emailed priya.sharma@infosys.com about the "
+        "$2.5 million deal closing on January 15, 2026. Call her at +91-98765-43210.",
+        "Plan a trip to Paris for me and my wife Neha. I live in Mumbai, SSN 456-78-9012.",
+        "John Smith was prescribed Metformin for Type 2 Diabetes under the HIPAA consent form.",
+    ]
+
+    def __init__(self, ner_backend: str = "torch", ner_cache_path: str | None = None,
+                 ner_cache_size: int = 2048, ner_cache_ttl: float | None = 3600,
+                 incremental_ner: bool = False, strict: bool = False,
+                 profile: str | None = None, microbatch_ms: float | None = None,
+                 microbatch_max: int = 16, regex_validation: dict | None = None,
+                 intent_source: str | None = None):
+        # ner_backend: torch / torch_int8 / onnx / onnx_int8 (see ner_backend.py)
+        self.model_id = MODEL_ID
+        self.ner_backend = ner_backend
+        self.model = load_ner_model(ner_backend, self.model_id)
+
+        # concurrent callers (threaded server): hold NER calls for up to
+        # microbatch_ms and run them as one batch
+        self.batcher = None
+        if microbatch_ms:
+            self.batcher = MicroBatcher(self.model, microbatch_ms, microbatch_max)
+            self.model = self.batcher
+
+        # raw GLiNER spans keyed by (model, labels, threshold, text).
+        # only spans live here - aliases are made per session by alias_manager,
+        # so a cache hit can never hand one session another session's fakes.
+        # memory only unless ner_cache_path is set - that sqlite file stores the
+        # spans (real names, emails, ids) as plaintext, opt in knowingly
+        self.ner_cache = TieredCache(ner_cache_size, ner_cache_ttl, ner_cache_path)
+
+        # multi-turn chat: NER per sentence, and sentences this session has
+        # already seen (re-pasted / quoted text) never hit the model again
+        self.incremental_ner = incremental_ner
+        self._sentence_cache = TieredCache(max_entries=8192, ttl=None)
+
+        # strict=True always runs NER, even when the gate says there's nothing to find
+        self.strict = strict
+
         self.alias_manager = AliasManager()
-        self.pattern_scanner = PatternScanner()
-        self.entity_classifier = EntityClassifier()
-
-        # labels we want GLiNER to look for
-        self.labels = [
-            # identity (will be replaced)
-            "person", "organization", "location",
-            "email address", "phone number",
-            "project name", "product name",
-            "government id",
-            # structural (will be perturbed slightly)
-            "date", "money amount",
-            # domain-critical (kept as-is)
-            "medical condition", "drug name",
-            "symptom", "medical procedure",
-            "legal concept", "financial instrument",
-            "regulatory term", "job title",
-        ]
+        self._alias_lock = threading.Lock()  # alias state is per session, shared by concurrent requests
+        # per-label checksum mode for regex hits, see PatternScanner.VALIDATION
+        self.pattern_scanner = PatternScanner(regex_validation)
+        # llm / model / heuristic, None = SP_INTENT_SOURCE (see entity_classifier.py)
+        self.entity_classifier = EntityClassifier(intent_source=intent_source or INTENT_SOURCE)
+        # gazetteer names (any case) are a reason to run NER too
+        self.ner_gate = NERGate(self.entity_classifier.gazetteer)
+
+        # label profile for this session (see label_profiles.py),
+        # None = pick one per prompt from keywords
+        self.default_profile = profile
+        self.profile = profile
+        if profile is not None:
+            profile_labels(profile)  # fail early on typos
+
+        self.threshold = self.THRESHOLD
+
+    def sanitize_prompt(self, user_prompt: str, strict: bool | None = None,
+                        profile: str | None = None) -> tuple:
+        """
+        run the full pipeline, returns (sanitized_text, entities, alias_map, score)
+        score["ner_skipped"] says whether the gate let us skip GLiNER,
+        score["label_profile"] which label set NER ran with
+        """
+        regex_entities, ner_entities, skip, reason, profile = self._detect(user_prompt, strict, profile)
+        return self._finish(user_prompt, regex_entities, ner_entities, skip, reason, profile)
+
+    async def asanitize_prompt(self, user_prompt: str, strict: bool | None = None,
+                               profile: str | None = None) -> tuple:
+        """
+        sanitize_prompt for async servers. regex / NER / classify run in a
+        worker thread, the LLM intent call is awaited on the event loop
+        """
+        classified, skip, reason, profile = await asyncio.to_thread(self._detect_and_classify, user_prompt, strict, profile)
 
-    def sanitize_prompt(self, user_prompt: str) -> tuple:
-        """run the full pipeline, returns (sanitized_text, entities, alias_map, score)"""
+        # layer 3.5 - intent override, without tying up a thread while ollama thinks
+        classified = await self.entity_classifier.aapply_intent(classified, user_prompt)
 
-        # layer 1 - regex
-        regex_entities = self.pattern_scanner.scan(user_prompt)
+        return self._score_and_replace(user_prompt, classified, skip, reason, profile)
+
+    def _detect(self, user_prompt, strict=None, profile=None):
+        """layers 1 + 2 for one prompt"""
+        # layer 1 - regex + gazetteer names
+        regex_entities = self._scan(user_prompt)
         # print("DEBUG regex found:", [e.get('text') for e in regex_entities]) # too noisy
 
-        # layer 2 - NER
-        ner_entities = self.model.predict_entities(
-            user_prompt, self.labels, threshold=0.6
-        )
-        for e in ner_entities:
-            e.setdefault("source", "ner")
-            
+        # layer 2 - NER (unless the gate is sure there's nothing for it)
+        skip, reason = self._should_skip_ner(user_prompt, regex_entities, strict)
+        profile = self._resolve_profile(user_prompt, profile)
+        ner_entities = [] if skip else self._run_ner([user_prompt], profile_labels(profile))[0]
         # print(f"DEBUG ner found: {len(ner_entities)}")
 
+        return regex_entities, ner_entities, skip, reason, profile
+
+    def _detect_and_classify(self, user_prompt, strict=None, profile=None):
+        regex_entities, ner_entities, skip, reason, profile = self._detect(user_prompt, strict, profile)
+        return self.entity_classifier.classify(regex_entities, ner_entities), skip, reason, profile
+
+    def sanitize_batch(self, prompts: list[str], batch_size: int = 8, strict: bool | None = None,
+                       profile: str | None = None) -> list[tuple]:
+        """
+        same as sanitize_prompt but for a whole list of prompts.
+        GLiNER runs batched (one forward pass per batch_size prompts) which is
+        where the time goes on CPU, everything after that is per prompt.
+        returns one (sanitized_text, entities, alias_map, score) per prompt
+        """
+        if not prompts:
+            return []
+
+        regex_batch = [self._scan(p) for p in prompts]
+        gate = [self._should_skip_ner(p, r, strict) for p, r in zip(prompts, regex_batch)]
+
+        profiles = [self._resolve_profile(p, profile) for p in prompts]
+
+        # only the prompts the gate didn't clear go to the model,
+        # one batched call per label profile
+        ner_batch = [[] for _ in prompts]
+        by_profile = {}
+        for i, (skip, _) in enumerate(gate):
+            if not skip:
+                by_profile.setdefault(profiles[i], []).append(i)
+        for name, indices in by_profile.items():
+            found = self._run_ner([prompts[i] for i in indices], profile_labels(name), batch_size)
+            for i, ner_entities in zip(indices, found):
+                ner_batch[i] = ner_entities
+
+        classified = [
+            self.entity_classifier.classify(regex_entities, ner_entities)
+            for regex_entities, ner_entities in zip(regex_batch, ner_batch)
+        ]
+        # intent for the whole batch - the LLM gets several prompts per call
+        classified = self.entity_classifier.apply_intent_batch(list(zip(classified, prompts)))
+
+        # aliases are shared across the batch (same session), so the
+        # alias map in each result is whatever it was after that prompt
+        return [
+            self._score_and_replace(prompt, entities, skip, reason, name)
+            for prompt, entities, (skip, reason), name
+            in zip(prompts, classified, gate, profiles)
+        ]
+
+    def _scan(self, text: str) -> list[dict]:
+        """regex patterns plus names from the detect__ gazetteer lists"""
+        return self.pattern_scanner.scan(text) + self.entity_classifier.gazetteer.detect(text)
+
+    def _should_skip_ner(self, text, regex_entities, strict=None):
+        if strict is None:
+            strict = self.strict
+        if strict:
+            return False, "strict"
+        return self.ner_gate.check(text, regex_entities)
+
+    def _resolve_profile(self, text, profile=None):
+        """per-request profile > session profile > keyword guess"""
+        return profile or self.profile or pick_profile(text)
+
+    def set_profile(self, profile: str | None):
+        """pin a label profile for the rest of this session (None = auto)"""
+        if profile is not None:
+            profile_labels(profile)
+        self.profile = profile
+
+    def _run_ner(self, texts: list[str], labels: list[str] | None = None, batch_size: int = 8) -> list[list[dict]]:
+        """NER for a list of texts, one entity list per text"""
+        labels = labels or self.LABELS
+        if self.incremental_ner:
+            return self._run_ner_incremental(texts, labels, batch_size)
+        return self._run_ner_windows(texts, labels, batch_size)
+
+    def _run_ner_incremental(self, texts: list[str], labels: list[str], batch_size: int = 8) -> list[list[dict]]:
+        """
+        split every text into sentences, only run NER on sentences this session
+        hasn't seen yet, then stitch the per-sentence spans back together.
+        sentences are matched on stripped + whitespace-collapsed text
+        """
+        per_text = []  # [(offset, normalized -> raw index map, key), ...] per text
+        known = {}     # key -> spans for this batch
+        unseen = {}    # key -> normalized sentence
+        for text in texts:
+            sentences = []
+            for offset, raw in split_sentences(text):
+                normalized, index_map = _normalize_sentence(raw)
+                if not normalized:
+                    continue
+                key = self._sentence_cache.make_key(labels, self.threshold, normalized)
+                sentences.append((offset, index_map, key))
+                if key in known or key in unseen:
+                    continue
+                cached = self._sentence_cache.get(key)
+                if cached is None:
+                    unseen[key] = normalized
+                else:
+                    known[key] = cached
+            per_text.append(sentences)
+
+        if unseen:
+            found = self._run_ner_windows(list(unseen.values()), labels, batch_size)
+            for key, ner_entities in zip(unseen, found):
+                self._sentence_cache.set(key, ner_entities)
+                known[key] = ner_entities
+
+        results = []
+        for text, sentences in zip(texts, per_text):
+            ner_entities = []
+            for offset, index_map, key in sentences:
+                for e in known[key]:
+                    # normalized offsets -> raw sentence -> full text
+                    e = dict(e)
+                    e["start"] = offset + index_map[e["start"]]
+                    e["end"] = offset + index_map[e["end"] - 1] + 1
+                    e["text"] = text[e["start"]:e["end"]]
+                    ner_entities.append(e)
+            results.append(ner_entities)
+        return results
+
+    def _run_ner_windows(self, texts: list[str], labels: list[str], batch_size: int = 8) -> list[list[dict]]:
+        """
+        GLiNER over a list of texts, one entity list per text.
+        long texts get cut into overlapping windows first (the model only
+        sees ~384 words), all windows go through as one batch.
+        windows already in the NER cache skip the model entirely
+        """
+        windowed = [make_windows(t) for t in texts]
+        flat = [w for windows in windowed for _, w in windows]
+
+        # only windows we haven't seen before go to the model
+        model_key = f"{self.model_id}:{self.ner_backend}"
+        keys = [self.ner_cache.make_key(model_key, labels, self.threshold, w) for w in flat]
+        flat_results = [self.ner_cache.get(k) for k in keys]
+        missing = [i for i, r in enumerate(flat_results) if r is None]
+
+        if missing:
+            predicted = self._predict([flat[i] for i in missing], labels, batch_size)
+            for i, ner_entities in zip(missing, predicted):
+                self.ner_cache.set(keys[i], ner_entities)
+                flat_results[i] = ner_entities
+
+        # regroup per text and map window offsets back
+        results = []
+        i = 0
+        for windows in windowed:
+            ner_entities = merge_window_entities(windows, flat_results[i:i + len(windows)])
+            i += len(windows)
+            for e in ner_entities:
+                e.setdefault("source", "ner")
+            results.append(ner_entities)
+        return results
+
+    def _predict(self, texts: list[str], labels: list[str], batch_size: int = 8) -> list[list[dict]]:
+        """straight to the model, no windowing or caching"""
+        if len(texts) == 1:
+            return [self.model.predict_entities(texts[0], labels, threshold=self.threshold)]
+        return self.model.batch_predict_entities(
+            texts, labels, threshold=self.threshold, batch_size=batch_size
+        )
+
+    def _finish(self, user_prompt: str, regex_entities: list[dict], ner_entities: list[dict],
+                ner_skipped: bool = False, skip_reason: str = "", profile: str = "full") -> tuple:
+        """layers 3+ (classify, intent, score, replace) for one prompt"""
+
         # layer 3 - classify and deduplicate
         classified = self.entity_classifier.classify(regex_entities, ner_entities)
 
         # layer 3.5 - intent override
-        # tries local LLM (qwen2.5) first, falls back to heuristic rules
-        classified = self.entity_classifier.apply_llm_intent_overrides(classified, user_prompt)
+        # local LLM (qwen2.5) with heuristic fallback, or the in-process model (intent_source)
+        classified = self.entity_classifier.apply_intent(classified, user_prompt)
 
+        return self._score_and_replace(user_prompt, classified, ner_skipped, skip_reason, profile)
+
+    def _score_and_replace(self, user_prompt, classified, ner_skipped=False, skip_reason="", profile="full"):
         # scoring
         privacy_score = self.entity_classifier.compute_privacy_score(classified)
+        privacy_score["ner_skipped"] = ner_skipped
+        privacy_score["ner_gate"] = skip_reason
+        privacy_score["label_profile"] = profile
 
         # replace entities in the text
-        sanitized_text = self.alias_manager.sanitize_by_offsets(user_prompt, classified)
+        with self._alias_lock:
+            sanitized_text, offsets = self.alias_manager.sanitize_with_map(user_prompt, classified)
+            alias_map = self.alias_manager.get_mapping()
+
+        # where each entity sits in the sanitized text, for highlighting.
+        # OffsetMap.from_entities(classified) gets the whole map back
+        for e in classified:
+            if "start" in e:
+                e["sanitized_start"], e["sanitized_end"] = offsets.span_to_sanitized(e["start"], e["end"])
+
+        return sanitized_text, classified, alias_map, privacy_score
 
-        return sanitized_text, classified, self.alias_manager.get_mapping(), privacy_score
+    def warmup(self, prompts: list[str] | None = None) -> float:
+        """
+        push a few prompts through the whole pipeline so the first real
+        request doesn't pay for torch kernel init, the ollama probe and faker
+        loading. leaves the session clean. returns seconds taken
+        """
+        t0 = time.time()
+        for prompt in prompts or self.WARMUP_PROMPTS:
+            sanitized, _, _, _ = self.sanitize_prompt(prompt, strict=True, profile="full")
+            self.desanitize_response(sanitized)
+        self.clear()
+        return time.time() - t0
 
-    def desanitize_response(self, llm_response: str) -> str:
-        """swap fake names back to real ones in the LLM response"""
-        return self.alias_manager.desanitize(llm_response)
+    def desanitize_response(self, llm_response: str, ignore_case: bool | None = None,
+                            partial_names: bool | None = None) -> str:
+        """
+        swap fake names back to real ones in the LLM response.
+        ignore_case / partial_names (surname-only mentions) default to the AliasManager's
+        """
+        return self.alias_manager.desanitize(llm_response, ignore_case=ignore_case, partial_names=partial_names)
+
+    def desanitize_stream(self, ignore_case: bool | None = None, partial_names: bool | None = None):
+        """
+        desanitize_response for a streamed LLM response: feed() each chunk,
+        send back what it returns, flush() at the end
+        """
+        return self.alias_manager.stream(ignore_case=ignore_case, partial_names=partial_names)
+
+    def cache_stats(self) -> dict:
+        """hit/miss counters for the NER cache, this session's sentence cache and the intent cache"""
+        stats = {"ner": self.ner_cache.stats(), "sentences": self._sentence_cache.stats()}
+        intent_clf = getattr(self.entity_classifier, "_intent_clf", None)
+        stats["intent"] = intent_clf.cache_stats() if intent_clf else None
+        return stats
+
+    def batcher_stats(self) -> dict | None:
+        """queue wait / batch size numbers from the micro-batcher, None if it's off"""
+        return self.batcher.stats() if self.batcher else None
+
+    def intent_stats(self) -> dict | None:
+        """ollama circuit breaker state + token / parse stats, None until something needed the intent LLM"""
+        intent_clf = getattr(self.entity_classifier, "_intent_clf", None)
+        if not intent_clf:
+            return None
+        return {"breaker": intent_clf.breaker.stats(), "calls": intent_clf.llm_stats()}
 
     def get_alias_map(self) -> dict:
         return self.alias_manager.get_mapping()
 
     def clear(self):
         """Reset for new session."""
-        self.alias_manager.clear()
\ No newline at end of file
+        self.alias_manager.clear()
+        self.profile = self.default_profile
+        self._sentence_cache = TieredCache(max_entries=8192, ttl=None)
+
+
+def _normalize_sentence(raw: str) -> tuple[str, list[int]]:
+    """
+    strip + collapse whitespace. also returns index_map where
+    index_map[i] is the position in raw of normalized[i]
+    """
+    chars, index_map = [], []
+    pending_space = False
+    for i, ch in enumerate(raw):
+        if ch.isspace():
+            pending_space = bool(chars)
+            continue
+        if pending_space:
+            chars.append(" ")
+            index_map.append(i - 1)
+            pending_space = False
+        chars.append(ch)
+        index_map.append(i)
+    return "".join(chars), index_map
\ No newline at end of file
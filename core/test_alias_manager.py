@@ -0,0 +1,230 @@
+"""
+tests for AliasManager.desanitize (single pass over a trie of fakes),
+the StreamingDesanitizer on top of it, and sanitize_with_map / OffsetMap.
+no model needed
+run: python -m pytest test_alias_manager.py
+"""
+
+import os
+import random
+import sys
+
+from faker import Faker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.alias_manager import AliasManager, OffsetMap, StreamingDesanitizer
+from core.bench_desanitize import legacy_desanitize
+from core.bench_sanitize_offsets import document, legacy_sanitize_by_offsets
+
+
+def manager_with(pairs, label="person", **options):
+    """AliasManager with fixed fake -> real aliases instead of random ones"""
+    manager = AliasManager(**options)
+    for real, fake in pairs:
+        manager.real_to_fake[real] = fake
+        manager.fake_to_real[fake] = real
+        manager._index_alias(fake, real, label)
+    return manager
+
+
+def test_same_as_old_replace_loop():
+    rng = random.Random(11)
+    random.seed(11)
+    Faker.seed(11)
+    manager = AliasManager()
+    for i in range(60):
+        manager.get_or_create(f"Real {i}", ["person", "organization", "location", "email"][i % 4])
+    fakes = list(manager.fake_to_real)
+    for _ in range(20):
+        text = " ".join(rng.choice(fakes) if rng.random() < 0.3 else rng.choice(["the", "and", "report", "."])
+                        for _ in range(200))
+        assert manager.desanitize(text) == legacy_desanitize(manager.fake_to_real, text)
+
+
+def test_longest_fake_wins():
+    manager = manager_with([("Tim Cook", "James Jones"), ("Apple", "James Jones Group")], label="organization")
+    assert manager.desanitize("James Jones Group hired James Jones.") == "Apple hired Tim Cook."
+
+
+def test_restored_text_is_not_replaced_again():
+    # the old loop turned "Jones" into "Lee" and then that "Lee" into "Park"
+    manager = manager_with([("Lee", "Jones"), ("Park", "Lee")], label="organization")
+    assert manager.desanitize("Jones met Lee") == "Lee met Park"
+
+
+def test_whole_words_only():
+    manager = manager_with([("Tim Cook", "Kim Lee")])
+    assert manager.desanitize("Kim Leeson and Kim Lee.") == "Kim Leeson and Tim Cook."
+
+
+def test_aliases_made_after_first_call_are_found():
+    manager = AliasManager()
+    first = manager.get_or_create("Tim Cook", "person")
+    assert manager.desanitize(first) == "Tim Cook"
+    second = manager.get_or_create("Infosys", "organization")
+    assert manager.desanitize(f"{first} at {second}") == "Tim Cook at Infosys"
+
+    # fake_to_real edited by hand still gets picked up
+    manager.fake_to_real["Zed Corp"] = "Acme"
+    assert manager.desanitize("Zed Corp") == "Acme"
+
+
+def test_possessives():
+    manager = manager_with([("Tim Cook", "James Jones"), ("Chris Evans", "Mark Reed")])
+    assert manager.desanitize("James Jones' plan") == "Tim Cook's plan"
+    assert manager.desanitize("James Jones's plan") == "Tim Cook's plan"
+    assert manager.desanitize("Mark Reed's plan") == "Chris Evans's plan"
+    assert manager.desanitize("James Jones' plan", possessives=False) == "Tim Cook' plan"
+
+
+def test_ignore_case_follows_llm_casing():
+    manager = manager_with([("Tim Cook", "James Jones")], ignore_case=True)
+    assert manager.desanitize("JAMES JONES / james jones / James jones") == "TIM COOK / tim cook / Tim Cook"
+    assert manager.desanitize("james jones", ignore_case=False) == "james jones"
+
+
+def test_surname_only_mentions():
+    manager = manager_with([("Dr. Priya Sharma", "Ananya Iyer"), ("Tim Cook", "James Jones")], partial_names=True)
+    assert manager.desanitize("Dr. Iyer and Mr. Jones agreed.") == "Dr. Sharma and Mr. Cook agreed."
+    assert manager.desanitize("Mr. Jones", partial_names=False) == "Mr. Jones"
+
+
+def test_shared_fake_surname_left_alone():
+    manager = manager_with([("Tim Cook", "James Jones"), ("Bob Smith", "Mary Jones")], partial_names=True)
+    assert manager.desanitize("James Jones and Mary Jones. Jones said") == "Tim Cook and Bob Smith. Jones said"
+
+
+def test_clear_forgets_aliases():
+    manager = manager_with([("Tim Cook", "James Jones")])
+    manager.desanitize("James Jones")
+    manager.clear()
+    assert manager.desanitize("James Jones") == "James Jones"
+
+
+def stream_all(manager, chunks, **options):
+    stream = manager.stream(**options)
+    return "".join(stream.feed(c) for c in chunks) + stream.flush()
+
+
+def test_stream_every_split_matches_desanitize():
+    options = {"partial_names": True, "ignore_case": True}
+    manager = manager_with([("Tim Cook", "James Jones"), ("Apple", "James Jones Group"),
+                            ("Dr. Priya Sharma", "Ananya Iyer")], **options)
+    text = "James Jones Group hired JAMES JONES' son; Dr. Iyer said James Jones's plan. James Jone"
+    for i in range(len(text) + 1):
+        for j in range(i, len(text) + 1):
+            out = stream_all(manager, [text[:i], text[i:j], text[j:]])
+            assert out == manager.desanitize(text), (i, j, out)
+
+
+def test_stream_random_chunks():
+    rng = random.Random(5)
+    random.seed(5)
+    Faker.seed(5)
+    manager = AliasManager(partial_names=True)
+    for i in range(40):
+        manager.get_or_create(f"Real {i}", ["person", "organization", "location"][i % 3])
+    fakes = list(manager.fake_to_real)
+    for _ in range(30):
+        text = " ".join(rng.choice(fakes) if rng.random() < 0.3 else rng.choice(["the", "Mr.", "x'", "."])
+                        for _ in range(80))
+        chunks, i = [], 0
+        while i < len(text):
+            n = rng.randint(1, 8)
+            chunks.append(text[i:i + n])
+            i += n
+        assert stream_all(manager, chunks) == manager.desanitize(text)
+
+
+def test_stream_holds_back_only_a_possible_fake():
+    manager = manager_with([("Tim Cook", "James Jones")])
+    stream = manager.stream()
+    assert stream.feed("Ask Jam") == "Ask "
+    assert stream.feed("es Jo") == ""
+    assert stream.feed("nes today") == "Tim Cook today"
+    assert stream.feed(" Jameson") == " Jameson"
+    assert stream.feed(" James Jones") == " "  # could still be "James Jonesy"
+    assert stream.feed("' car") == "Tim Cook's car"
+    assert stream.flush() == ""
+
+
+def test_stream_without_aliases_passes_through():
+    stream = StreamingDesanitizer(AliasManager())
+    assert stream.feed("hello ") == "hello "
+    assert stream.feed("there") == "there"
+    assert stream.flush() == ""
+
+
+def test_sanitize_same_as_old_slicing_loop():
+    text, entities = document(random.Random(3), 100, 8_000)
+    entities[5]["tier"] = "PRESERVE"
+    manager = AliasManager()
+    assert manager.sanitize_by_offsets(text, entities) == legacy_sanitize_by_offsets(manager, text, entities)
+
+
+def test_offset_map_both_ways():
+    manager = manager_with([("Tim Cook", "Al Li"), ("Apple", "Northwind Traders")])
+    text = "Tim Cook runs Apple in Cupertino."
+    entities = [
+        {"text": "Tim Cook", "label": "person", "start": 0, "end": 8, "tier": "REPLACE"},
+        {"text": "Apple", "label": "organization", "start": 14, "end": 19, "tier": "REPLACE"},
+        {"text": "Cupertino", "label": "location", "start": 23, "end": 32, "tier": "PRESERVE"},
+    ]
+    sanitized, offsets = manager.sanitize_with_map(text, entities)
+    assert sanitized == "Al Li runs Northwind Traders in Cupertino."
+    assert offsets.spans == [(0, 8, 0, 5), (14, 19, 11, 28)]
+
+    for e in entities:
+        start, end = offsets.span_to_sanitized(e["start"], e["end"])
+        expected = manager.real_to_fake.get(e["text"], e["text"]) if e["tier"] != "PRESERVE" else e["text"]
+        assert sanitized[start:end] == expected
+        assert offsets.span_to_original(start, end) == (e["start"], e["end"])
+    assert offsets.to_sanitized(len(text)) == len(sanitized)
+    assert offsets.to_original(len(sanitized)) == len(text)
+    # inside a replaced span -> that span on the other side
+    assert offsets.to_sanitized(3) == 0
+    assert offsets.span_to_original(1, 3) == (0, 8)
+    assert OffsetMap(offsets.to_list()).spans == offsets.spans
+
+
+def test_overlapping_entity_skipped():
+    manager = manager_with([("Tim Cook", "Al Li"), ("Cook", "Bo")])
+    entities = [
+        {"text": "Cook", "label": "person", "start": 4, "end": 8, "tier": "REPLACE"},
+        {"text": "Tim Cook", "label": "person", "start": 0, "end": 8, "tier": "REPLACE"},
+    ]
+    sanitized, offsets = manager.sanitize_with_map("Tim Cook said", entities)
+    assert sanitized == "Al Li said"
+    assert len(offsets) == 1
+
+
+def test_partial_overlap_never_leaks():
+    # classify keeps entities that overlap by up to half, the bit past the
+    # email still has to be replaced
+    manager = AliasManager()
+    text = "Contact: priya.sharma@infosys.com Sharma Priya today"
+    entities = [
+        {"text": "priya.sharma@infosys.com", "label": "email", "start": 9, "end": 33, "tier": "REPLACE"},
+        {"text": "infosys.com Sharma Priya", "label": "person", "start": 22, "end": 46, "tier": "REPLACE"},
+    ]
+    sanitized, offsets = manager.sanitize_with_map(text, entities)
+    assert "priya" not in sanitized.lower() and "sharma" not in sanitized.lower()
+    assert sanitized.endswith(" today") and sanitized.startswith("Contact: ")
+    assert len(offsets) == 2
+    assert manager.desanitize(sanitized) == text
+    assert offsets.spans[1][:2] == (33, 46)
+    start, end = offsets.span_to_sanitized(22, 46)
+    assert sanitized[end:] == " today"
+    for e in entities:
+        e["sanitized_start"], e["sanitized_end"] = offsets.span_to_sanitized(e["start"], e["end"])
+    assert OffsetMap.from_entities(entities).spans == offsets.spans
+
+
+def test_offset_map_from_entities():
+    manager = manager_with([("Tim Cook", "Al Li")])
+    entities = [{"text": "Tim Cook", "label": "person", "start": 6, "end": 14, "tier": "REPLACE"},
+                {"text": "Paris", "label": "location", "start": 18, "end": 23, "tier": "PRESERVE"}]
+    _, offsets = manager.sanitize_with_map("Hello Tim Cook in Paris", entities)
+    for e in entities:
+        e["sanitized_start"], e["sanitized_end"] = offsets.span_to_sanitized(e["start"], e["end"])
+    assert OffsetMap.from_entities(entities).spans == offsets.spans
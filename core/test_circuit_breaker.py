@@ -0,0 +1,143 @@
+"""
+tests for CircuitBreaker: closed -> open -> half open -> closed / open,
+only one trial call at a time in half open, and what IntentClassifier
+records for a reply it can't read. no ollama needed
+run: python -m pytest test_circuit_breaker.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.circuit_breaker import CircuitBreaker
+from core.intent_classifier import IntentClassifier
+
+PROBE_INTERVAL = 0.01
+
+
+class Dependency:
+    """what the probe looks at"""
+
+    def __init__(self):
+        self.healthy = False
+
+    def probe(self):
+        return self.healthy
+
+
+def make_breaker(dep):
+    return CircuitBreaker(probe=dep.probe, failure_threshold=2, slow_call_s=1.0,
+                          probe_interval=PROBE_INTERVAL, name="test")
+
+
+def wait_for(breaker, state, timeout=2.0):
+    deadline = time.time() + timeout
+    while breaker.state != state:
+        assert time.time() < deadline, f"still {breaker.state}, wanted {state}"
+        time.sleep(PROBE_INTERVAL)
+
+
+def open_then_half_open(breaker, dep):
+    dep.healthy = False
+    breaker.trip("down")
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow() and not breaker.ready()
+    time.sleep(PROBE_INTERVAL * 5)
+    assert breaker.state == CircuitBreaker.OPEN  # probe keeps failing, stays open
+    dep.healthy = True
+    wait_for(breaker, CircuitBreaker.HALF_OPEN)
+
+
+def test_failures_open_it():
+    breaker = make_breaker(Dependency())
+    assert breaker.allow()
+    breaker.record_failure("boom")
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_success(0.1)  # resets the streak
+    breaker.record_failure("boom")
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_success(5.0)  # slow = failure
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+    assert not breaker.ready() and not breaker.ready()  # a peek isn't a rejection
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_half_open_trial_succeeds_closes():
+    dep = Dependency()
+    breaker = make_breaker(dep)
+    open_then_half_open(breaker, dep)
+
+    assert breaker.ready()
+    assert breaker.allow()       # the trial
+    assert not breaker.allow()   # everyone else falls back meanwhile
+    assert not breaker.ready()
+    assert breaker.stats()["trial_in_flight"]
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_half_open_trial_fails_reopens():
+    dep = Dependency()
+    breaker = make_breaker(dep)
+    open_then_half_open(breaker, dep)
+    assert breaker.allow()
+    breaker.record_failure("still sick")
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    # probing starts again, next trial is slow -> open again
+    wait_for(breaker, CircuitBreaker.HALF_OPEN)
+    assert breaker.allow()
+    breaker.record_success(5.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_released_trial_frees_the_slot():
+    dep = Dependency()
+    breaker = make_breaker(dep)
+    open_then_half_open(breaker, dep)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_one_trial_among_concurrent_callers():
+    dep = Dependency()
+    breaker = make_breaker(dep)
+    open_then_half_open(breaker, dep)
+
+    allowed = []
+    start = threading.Barrier(16)
+
+    def caller():
+        start.wait()
+        allowed.append(breaker.allow())
+
+    threads = [threading.Thread(target=caller) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert allowed.count(True) == 1
+
+
+def test_unparseable_reply_is_one_failure():
+    # ollama (or a proxy in front of it) answers 200 with a body that isn't json
+    clf = IntentClassifier(cache_path=None, base_url="http://127.0.0.1:9", breaker_failures=2)
+    clf._client = httpx.Client(base_url="http://ollama",
+                               transport=httpx.MockTransport(lambda req: httpx.Response(200, text="<html>")))
+    clf.breaker.state = CircuitBreaker.CLOSED
+    assert clf.classify("Trip to Paris", ["Paris"]) is None
+    stats = clf.breaker.stats()
+    assert (stats["calls"], stats["failed_calls"]) == (1, 1)  # not a success and then a failure
+    assert clf.classify("Trip to Paris", ["Paris"]) is None
+    assert clf.breaker.state == CircuitBreaker.OPEN  # the streak wasn't reset in between
+    clf.close()
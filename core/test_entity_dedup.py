@@ -0,0 +1,102 @@
+"""
+checks that EntityClassifier.classify dedups exactly like the old
+set-of-positions version did (>50% overlap with a kept entity = dropped,
+longest first). no model needed
+run: python -m pytest test_entity_dedup.py
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.entity_classifier import EntityClassifier, _Occupied
+
+classifier = EntityClassifier()
+
+LABELS = ["person", "organization", "location", "email", "phone", "date", "money amount", "drug name"]
+
+
+def legacy_dedup(entities):
+    """the old classify dedup, straight copy"""
+    entities = sorted(entities, key=lambda e: e["end"] - e["start"], reverse=True)
+    kept = []
+    occupied = set()
+    for entity in entities:
+        span = set(range(entity["start"], entity["end"]))
+        overlap = span & occupied
+        if len(overlap) > len(span) * 0.5:
+            continue
+        kept.append(entity)
+        occupied |= span
+    return kept
+
+
+def random_entities(rng, n, doc_len, lengths=(0, 1, 2, 3, 5, 8, 13, 20, 40)):
+    entities = []
+    for i in range(n):
+        start = rng.randrange(doc_len)
+        end = min(doc_len, start + rng.choice(lengths))
+        entities.append({
+            "text": f"e{i}", "label": rng.choice(LABELS),
+            "start": start, "end": end, "source": rng.choice(["regex", "ner"]),
+        })
+    return entities
+
+
+def spans(entities):
+    return [(e["start"], e["end"], e["text"]) for e in entities]
+
+
+def test_matches_legacy_random():
+    rng = random.Random(11)
+    for _ in range(2000):
+        entities = random_entities(rng, rng.randint(0, 40), rng.randint(1, 120))
+        expected = legacy_dedup([dict(e) for e in entities])
+        got = classifier.classify([], [dict(e) for e in entities])
+        assert spans(got) == spans(expected), (entities, spans(got), spans(expected))
+
+
+def test_matches_legacy_many_entities():
+    rng = random.Random(12)
+    entities = random_entities(rng, 3000, 50_000)
+    expected = legacy_dedup([dict(e) for e in entities])
+    got = classifier.classify([], [dict(e) for e in entities])
+    assert spans(got) == spans(expected)
+
+
+def test_half_overlap_is_kept():
+    # exactly 50% covered is not "more than half", so both stay
+    entities = [
+        {"text": "abcd", "label": "person", "start": 0, "end": 4},
+        {"text": "cdef", "label": "location", "start": 2, "end": 6},
+    ]
+    assert len(classifier.classify([], entities)) == 2
+
+
+def test_dedup_direct():
+    rng = random.Random(13)
+    for _ in range(500):
+        entities = random_entities(rng, rng.randint(0, 60), rng.randint(1, 300), (1, 4, 10, 30, 90))
+        assert spans(classifier.dedup(entities)) == spans(legacy_dedup(entities))
+
+
+def test_longest_wins():
+    entities = [
+        {"text": "Priya", "label": "person", "start": 4, "end": 9},
+        {"text": "Dr. Priya Sharma", "label": "person", "start": 0, "end": 16},
+    ]
+    kept = classifier.classify([], entities)
+    assert [e["text"] for e in kept] == ["Dr. Priya Sharma"]
+
+
+def test_occupied_merges_intervals():
+    occupied = _Occupied()
+    occupied.add(10, 20)
+    occupied.add(30, 40)
+    occupied.add(20, 30)   # touches both, everything becomes one interval
+    occupied.add(5, 5)     # empty, ignored
+    assert (occupied.starts, occupied.ends) == ([10], [40])
+    assert occupied.overlap(0, 15) == 5
+    assert occupied.overlap(35, 50) == 5
+    assert occupied.overlap(40, 45) == 0
@@ -0,0 +1,208 @@
+"""
+tests for the async / pooled IntentClassifier against a stub ollama
+(a tiny local http server), so no real model or ollama needed
+run: python -m pytest test_intent_async.py
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.entity_classifier import EntityClassifier
+from core.intent_classifier import MODEL_NAME, IntentClassifier
+
+STUB_DELAY = 0.3  # seconds every /api/generate takes, like a slow model
+
+
+class _StubOllama(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real thing
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._reply({"models": [{"name": MODEL_NAME}]})
+        else:
+            self._reply({"error": "not found"}, 404)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(STUB_DELAY)
+        # "Paris" is always the task, everything else identity
+        entities = json.loads(body["prompt"].rsplit("Entities: ", 1)[1])
+        self.server.last_body = body
+        answer = {
+            "task": [e for e in entities if e == "Paris"],
+            "identity": [e for e in entities if e != "Paris"],
+        }
+        self.server.generate_calls += 1
+        self._reply({"response": json.dumps(answer)})
+
+    def _reply(self, obj, status=200):
+        raw = json.dumps(obj).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+        except OSError:
+            pass  # client gave up (the timeout test)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOllama)
+    server.daemon_threads = True
+    server.generate_calls = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+server = start_stub()
+STUB_URL = f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def make_classifier(**kwargs):
+    return IntentClassifier(cache_path=None, base_url=STUB_URL, **kwargs)
+
+
+def test_sync_classify():
+    clf = make_classifier()
+    assert clf.available
+    result = clf.classify("Plan a trip to Paris. I live in Mumbai.", ["Paris", "Mumbai"])
+    assert result == {"task": ["Paris"], "identity": ["Mumbai"]}
+    clf.close()
+
+
+def test_request_is_compact_and_structured():
+    clf = make_classifier()
+    filler = "We have a lot of background on the project that the model does not need. " * 10
+    clf.classify(filler + "Book me a hotel in Paris for June." + filler, ["Paris"])
+    body = server.last_body
+    assert "Paris" in body["prompt"] and len(body["prompt"]) < len(filler)
+    assert body["format"]["required"] == ["task", "identity"]
+    assert body["keep_alive"]
+    assert clf.llm_stats()["calls"] == 1 and clf.llm_stats()["parse_failures"] == 0
+    clf.close()
+
+
+def test_concurrent_async_calls_overlap():
+    clf = make_classifier()
+    n = 6
+    calls_before = server.generate_calls
+
+    async def run():
+        prompts = [f"Trip number {i} to Paris from Mumbai." for i in range(n)]
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(clf.aclassify(p, ["Paris", "Mumbai"]) for p in prompts))
+        elapsed = time.perf_counter() - t0
+        await clf.aclose()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(run())
+    assert all(r == {"task": ["Paris"], "identity": ["Mumbai"]} for r in results)
+    assert server.generate_calls - calls_before == n
+    # one after the other would take n * STUB_DELAY
+    assert elapsed < n * STUB_DELAY / 2, f"calls didnt overlap: {elapsed:.2f}s"
+
+
+def test_event_loop_not_blocked():
+    clf = make_classifier()
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.02)
+
+    async def run():
+        await asyncio.gather(clf.aclassify("Flights to Paris please", ["Paris"]), ticker())
+        await clf.aclose()
+
+    asyncio.run(run())
+    gaps = [b - a for a, b in zip(ticks, ticks[1:])]
+    assert max(gaps) < STUB_DELAY / 2, f"loop stalled for {max(gaps):.2f}s"
+
+
+def test_per_call_timeout():
+    clf = make_classifier()
+
+    async def run():
+        result = await clf.aclassify("Hotels in Paris near Mumbai office", ["Paris"], timeout=STUB_DELAY / 3)
+        await clf.aclose()
+        return result
+
+    assert asyncio.run(run()) is None  # timed out -> caller falls back
+
+
+def test_async_overrides_on_entity_classifier():
+    classifier = EntityClassifier()
+    classifier._intent_clf = make_classifier()
+    prompt = "Plan a trip to Paris, I live in Mumbai"
+    entities = [
+        {"text": "Paris", "label": "location", "start": 15, "end": 20, "tier": "REPLACE"},
+        {"text": "Mumbai", "label": "location", "start": 32, "end": 38, "tier": "REPLACE"},
+    ]
+
+    async def run():
+        out = await classifier.aapply_llm_intent_overrides(entities, prompt)
+        await classifier._intent_clf.aclose()
+        return out
+
+    out = asyncio.run(run())
+    assert [(e["text"], e["tier"]) for e in out] == [("Paris", "PRESERVE"), ("Mumbai", "REPLACE")]
+    assert out[0]["intent_source"] == "llm"
+
+
+def test_half_open_sends_one_trial_call():
+    clf = make_classifier()
+    clf.breaker.state = clf.breaker.HALF_OPEN  # as if the probe just came back ok
+    calls_before = server.generate_calls
+
+    async def run():
+        prompts = [f"Half open trip {i} to Paris" for i in range(5)]
+        results = await asyncio.gather(*(clf.aclassify(p, ["Paris"]) for p in prompts))
+        await clf.aclose()
+        return results
+
+    results = asyncio.run(run())
+    # the trial got its answer, the rest fell back instead of queueing on ollama
+    assert server.generate_calls - calls_before == 1
+    assert sum(r is not None for r in results) == 1
+    assert clf.breaker.state == clf.breaker.CLOSED
+
+
+def test_new_loop_closes_the_old_client():
+    clf = make_classifier()
+    clients = []
+
+    async def use(i):
+        assert await clf.aclassify(f"Loop {i} trip to Paris", ["Paris"]) is not None
+        clients.append(clf._aclient)
+
+    # asyncio.run closes the client with its loop
+    asyncio.run(use(0))
+    assert clients[0].is_closed
+
+    # a loop still running in another thread gets its client closed over there
+    other = asyncio.new_event_loop()
+    runner = threading.Thread(target=other.run_forever, daemon=True)
+    runner.start()
+    asyncio.run_coroutine_threadsafe(use(1), other).result()
+    assert not clients[1].is_closed
+    asyncio.run(use(2))
+    deadline = time.time() + 2
+    while not clients[1].is_closed:
+        assert time.time() < deadline, "old client never closed"
+        time.sleep(0.01)
+    assert clients[2].is_closed and len({id(c) for c in clients}) == 3
+    other.call_soon_threadsafe(other.stop)
+    runner.join()
+    other.close()
+    clf.close()
@@ -0,0 +1,106 @@
+"""
+tests for the in-process intent model (intent_model.py), the
+intent_source switch on EntityClassifier and the keyword heuristics
+it falls back to. no ollama or GLiNER needed
+run: python -m pytest test_intent_model.py
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.entity_classifier import EntityClassifier
+from core.intent_model import INTENT_MODEL_PATH, IntentModel, load_examples
+
+PATTERNS = (EntityClassifier.TOPIC_PATTERNS, EntityClassifier.IDENTITY_ANCHORS)
+
+PROMPT = "Plan a trip to Paris for me and my wife. I live in Mumbai."
+
+
+def entities():
+    return [
+        {"text": "Paris", "label": "location", "start": 15, "end": 20, "tier": "REPLACE"},
+        {"text": "Mumbai", "label": "location", "start": 51, "end": 57, "tier": "REPLACE"},
+        {"text": "Neha", "label": "person", "tier": "REPLACE"},
+    ]
+
+
+def test_labels_cover_every_prompt():
+    examples = load_examples()
+    assert examples
+    for pid, prompt, ents, y in examples:
+        assert ents, f"{pid}: no labelled mention found in the prompt"
+        assert len(ents) == len(y)
+        for e in ents:
+            assert prompt[e["start"]:e["end"]] == e["text"]
+
+
+def test_batch_scores_match_one_at_a_time():
+    model = IntentModel.load(INTENT_MODEL_PATH, *PATTERNS)
+    ents = entities()
+    together = model.predict_proba(PROMPT, ents)
+    alone = [model.predict_proba(PROMPT, [e])[0] for e in ents]
+    assert all(abs(a - b) < 1e-9 for a, b in zip(together, alone))
+    assert together[2] == 0.0  # people never become task
+
+
+def test_save_load_roundtrip():
+    examples = [(p, ents, y) for _, p, ents, y in load_examples()[:10]]
+    model = IntentModel.train(examples, *PATTERNS, epochs=20)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "m.json")
+        model.save(path)
+        loaded = IntentModel.load(path, *PATTERNS)
+    assert abs(loaded.predict_proba(PROMPT, entities()) - model.predict_proba(PROMPT, entities())).max() < 1e-4
+
+
+def test_model_source_on_entity_classifier():
+    classifier = EntityClassifier(intent_source="model")
+    out = classifier.apply_intent(entities(), PROMPT)
+    by_text = {e["text"]: e for e in out}
+    assert by_text["Paris"]["tier"] == "PRESERVE"
+    assert by_text["Paris"]["intent_source"] == "model"
+    assert by_text["Mumbai"]["tier"] == "REPLACE"
+    assert by_text["Neha"]["tier"] == "REPLACE"
+
+
+def test_missing_weights_fall_back_to_heuristics():
+    classifier = EntityClassifier(intent_source="model", intent_model_path="/nonexistent/intent_model.json")
+    out = classifier.apply_intent(entities(), PROMPT)
+    paris = out[0]
+    assert paris["tier"] == "PRESERVE" and "intent_source" not in paris
+
+
+def test_unknown_source_rejected():
+    try:
+        EntityClassifier(intent_source="gpt")
+    except ValueError:
+        return
+    raise AssertionError("expected ValueError")
+
+
+def located(prompt, text, label="location", nth=0):
+    start = -1
+    for _ in range(nth + 1):
+        start = prompt.index(text, start + 1)
+    return {"text": text, "label": label, "start": start, "end": start + len(text), "tier": "REPLACE"}
+
+
+def test_heuristics_judge_each_occurrence():
+    prompt = "I live in Mumbai. Plan a weekend trip for my parents visiting Mumbai."
+    entities = [located(prompt, "Mumbai"), located(prompt, "Mumbai", nth=1)]
+    out = EntityClassifier(intent_source="heuristic").apply_intent(entities, prompt)
+    assert [e["tier"] for e in out] == ["REPLACE", "PRESERVE"]
+
+
+def test_heuristics_anchor_not_cut_at_window_edge():
+    # the 40 chars before Jaipur start at the "i" of "Delhi live" - sliced out
+    # on their own that read as the anchor "i live"
+    head = "Plan a trip to catch Delhi live music, "
+    gap = EntityClassifier.ANCHOR_WINDOW - len("i live music, ")
+    prompt = head + "x" * (gap - len("then ")) + "then Jaipur."
+    jaipur = located(prompt, "Jaipur")
+    assert prompt[jaipur["start"] - EntityClassifier.ANCHOR_WINDOW:].startswith("i live")
+    out = EntityClassifier(intent_source="heuristic").apply_intent([jaipur], prompt)
+    assert out[0]["tier"] == "PRESERVE"
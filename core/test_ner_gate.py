@@ -0,0 +1,55 @@
+"""
+tests for NERGate: which prompts may skip GLiNER, lowercase names and
+places included. no model needed
+run: python -m pytest test_ner_gate.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.entity_classifier import EntityClassifier
+from core.ner_gate import NERGate
+
+gate = NERGate(EntityClassifier().gazetteer)
+
+
+def check(text):
+    return gate.check(text, [])
+
+
+def test_generic_prompts_skip():
+    for text in [
+        "write a haiku about rain",
+        "Explain recursion in simple terms.",
+        "give me tips for a job interview",
+        "summarize this article in three sentences",
+        "what is the difference between a list and a tuple",
+        "write a short story about a dog who learns to fly",
+    ]:
+        assert check(text) == (True, "no_cues"), text
+
+
+def test_lowercase_pii_runs_ner():
+    assert check("i live in mumbai, suggest cafes") == (False, "identity_anchor")
+    assert check("tell john that sarah is sick") == (False, "uncommon_word:john")
+    assert not check("email rahul about the infosys offer")[0]
+    assert not check("ask priya to review the report")[0]
+
+
+def test_identity_anchors_run_ner():
+    for text in ["i work at a startup", "we are based in a small town", "my friend is from there"]:
+        assert not check(text)[0], text
+
+
+def test_gazetteer_names_run_ner():
+    # whitelisted city in lowercase, every other word is common
+    assert check("suggest cafes in paris") == (False, "gazetteer_hit")
+    assert NERGate().check("suggest cafes in paris", [])[0] is False  # still an unknown word without lists
+
+
+def test_other_cues_still_run_ner():
+    assert check("Write to Neha about it") == (False, "proper_noun:Neha")
+    assert check("what does NASA do")[1] == "acronym:NASA"
+    assert check("pay 500 dollars by friday")[0] is False
+    assert gate.check("write a haiku", [{"label": "email"}]) == (False, "regex_hit")
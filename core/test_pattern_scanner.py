@@ -0,0 +1,157 @@
+"""
+tests for PatternScanner: the checksum validators, strict / lenient /
+off validation, the trigger-based single pass (_iter_matches) vs a
+plain finditer over the combined regex, and scan_stream vs scan over
+random chunkings. no model needed
+run: python -m pytest test_pattern_scanner.py
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.pattern_scanner import PatternScanner, ip_ok, luhn_ok, pan_ok, ssn_ok, verhoeff_ok
+
+
+def found(text, **kwargs):
+    return [(e["label"], e["text"], e.get("valid")) for e in PatternScanner(**kwargs).scan(text)]
+
+
+def test_luhn():
+    for card in ["4111 1111 1111 1111", "4539-1488-0343-6467", "5500000000000004", "378282246310005"]:
+        assert luhn_ok(card), card
+    for card in ["4111 1111 1111 1112", "4539-1488-0343-6468", "1234567812345678"]:
+        assert not luhn_ok(card), card
+
+
+def test_verhoeff():
+    for number in ["2345 6789 0124", "4987-6543-2102"]:
+        assert verhoeff_ok(number), number
+    # wrong check digit, swapped digits, starts with 0 / 1
+    for number in ["2345 6789 0125", "2345 6789 0214", "0345 6789 0124", "1234 5678 9012"]:
+        assert not verhoeff_ok(number), number
+
+
+def test_ip():
+    for ip in ["192.168.1.10", "8.8.8.8", "255.255.255.255", "0.0.0.0"]:
+        assert ip_ok(ip), ip
+    for ip in ["256.1.1.1", "10.01.1.1", "1.2.3.999"]:
+        assert not ip_ok(ip), ip
+
+
+def test_ssn():
+    for ssn in ["123-45-6789", "900-12-3456"]:  # 9xx = ITIN, still a tax id
+        assert ssn_ok(ssn), ssn
+    for ssn in ["000-12-3456", "666-12-3456", "123-00-4567", "123-45-0000"]:
+        assert not ssn_ok(ssn), ssn
+
+
+def test_pan():
+    for pan in ["ABCPE1234F", "AAACB1234C", "BBBHK9999Z"]:
+        assert pan_ok(pan), pan
+    for pan in ["ABCXE1234F", "ABCDE1234F"]:
+        assert not pan_ok(pan), pan
+
+
+def test_strict_drops_invalid_and_its_span():
+    # an invalid card isn't redacted, and its digits don't come back as a phone number
+    assert found("card 4111 1111 1111 1112 ok") == []
+    assert found("card 4111 1111 1111 1111 ok") == [("credit_card", "4111 1111 1111 1111", True)]
+    assert found("ssn 666-12-3456, ip 10.01.1.1, pan ABCXE1234F") == []
+    assert found("ssn 123-45-6789 ip 192.168.1.10 pan ABCPE1234F") == [
+        ("ssn", "123-45-6789", True), ("ip_address", "192.168.1.10", True), ("pan_card", "ABCPE1234F", True),
+    ]
+
+
+def test_aadhaar_lenient_by_default():
+    # made-up / typo'd aadhaar numbers still get replaced, just tagged
+    assert found("aadhaar 2345 6789 0125") == [("aadhaar", "2345 6789 0125", False)]
+    assert found("aadhaar 2345 6789 0124") == [("aadhaar", "2345 6789 0124", True)]
+    assert found("aadhaar 2345 6789 0125", validation={"aadhaar": "strict"}) == []
+
+
+def test_validation_overrides():
+    assert found("card 4111 1111 1111 1112", validation={"credit_card": "lenient"}) == [
+        ("credit_card", "4111 1111 1111 1112", False)]
+    assert found("card 4111 1111 1111 1112", validation={"credit_card": "off"}) == [
+        ("credit_card", "4111 1111 1111 1112", None)]
+    try:
+        PatternScanner(validation={"ssn": "loose"})
+    except ValueError:
+        return
+    raise AssertionError("expected ValueError")
+
+
+def test_trigger_scan_matches_plain_finditer():
+    rng = random.Random(7)
+    pieces = [
+        "john.smith@example.com", "a.b+c@mail.co.in", "https://example.com/a?b=1&c=2", "http://x.io",
+        "4111 1111 1111 1111", "2345 6789 0124", "123-45-6789", "192.168.1.10", "ABCPE1234F",
+        "+91 98765 43210", "(555) 123-4567", "555.123.4567", "+1 555 123 4567",
+        "john.smith5551234567", "v1.2.3.4", "call", "me", "at", "or", "the", "@", ":", "(", "+",
+        "10:30", "x", "ABCDE", ".", ",", "-",
+    ]
+    scanner = PatternScanner(validation={label: "off" for label in PatternScanner.VALIDATION})
+    for _ in range(300):
+        text = rng.choice(["", " "]).join(rng.choice(pieces) for _ in range(rng.randint(1, 25)))
+        fast = [(m.start(), m.end(), m.lastgroup) for m in scanner._iter_matches(text)]
+        plain = [(m.start(), m.end(), m.lastgroup) for m in PatternScanner._COMBINED.finditer(text)]
+        assert fast == plain, text
+
+
+def test_match_starts_before_trigger():
+    # email local part, the https of a url, the letters of a PAN
+    assert found("mail john.smith@example.com now") == [("email", "john.smith@example.com", None)]
+    assert found("see https://example.com/a") == [("url", "https://example.com/a", None)]
+    assert found("PAN: ABCPE1234F") == [("pan_card", "ABCPE1234F", True)]
+
+
+def test_precedence_on_same_start():
+    # an aadhaar-shaped number is aadhaar, not a phone
+    assert found("2345 6789 0124")[0][0] == "aadhaar"
+    assert found("ring +91 98765 43210") == [("phone_in", "+91 98765 43210", None)]
+
+
+def stream(scanner, text, cuts):
+    cuts = sorted(cuts)
+    chunks = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+    return list(scanner.scan_stream(chunks))
+
+
+def test_stream_keeps_match_that_grows_left():
+    # the digits are held at the chunk end, the email they turn out to be
+    # part of starts further left, inside the tail
+    scanner = PatternScanner()
+    filler = "lorem ipsum dolor " * 60
+    text = filler + "contact john.smith5551234567@example.com today"
+    cut = text.index("@")
+    assert stream(scanner, text, [cut]) == scanner.scan(text)
+    assert [e["text"] for e in stream(scanner, text, [cut])] == ["john.smith5551234567@example.com"]
+
+
+def test_stream_same_as_scan_random_splits():
+    rng = random.Random(3)
+    pieces = [
+        "john.smith5551234567@example.com", "a.b+c@mail.co.in", "https://example.com/a?b=1",
+        "4111 1111 1111 1111", "2345 6789 0125", "123-45-6789", "192.168.1.10", "ABCPE1234F",
+        "+91 98765 43210", "(555) 123-4567", "call", "me", "on", "lorem", "ipsum", "dolor", ".",
+    ]
+    for tail in (40, 64, 512):  # STREAM_TAIL has to cover the longest match
+        scanner = PatternScanner()
+        scanner.STREAM_TAIL = tail
+        for _ in range(150):
+            text = " ".join(rng.choice(pieces) for _ in range(rng.randint(1, 60)))
+            cuts = {rng.randint(0, len(text)) for _ in range(rng.randint(1, 6))}
+            # always split inside an email's local part when there is one
+            at = text.find("@")
+            if at > 3:
+                cuts.add(rng.randint(at - 3, at))
+            assert stream(scanner, text, cuts) == scanner.scan(text), (tail, text, sorted(cuts))
+
+
+def test_stream_every_split_of_an_email():
+    scanner = PatternScanner()
+    text = "x " * 300 + "mail john.smith5551234567@example.com or call 555-123-4567 now"
+    for cut in range(len(text) - 80, len(text) + 1):
+        assert stream(scanner, text, [cut]) == scanner.scan(text), cut
@@ -0,0 +1,60 @@
+"""
+tests for merge_window_entities: the bisect overlap check keeps exactly
+what the old check against every kept entity did. no model needed
+run: python -m pytest test_text_windows.py
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.text_windows import merge_window_entities
+
+
+def legacy_merge(windows, results):
+    """the old pairwise version, straight copy"""
+    shifted = []
+    for (offset, _), entities in zip(windows, results):
+        for e in entities:
+            e = dict(e)
+            e["start"] += offset
+            e["end"] += offset
+            shifted.append(e)
+    if len(windows) == 1:
+        return shifted
+    shifted.sort(key=lambda e: (e["end"] - e["start"], e.get("score", 0)), reverse=True)
+    kept = []
+    for e in shifted:
+        if any(k["label"] == e["label"] and k["start"] < e["end"] and e["start"] < k["end"] for k in kept):
+            continue
+        kept.append(e)
+    kept.sort(key=lambda e: e["start"])
+    return kept
+
+
+def test_same_entity_in_two_windows_kept_once():
+    windows = [(0, "x" * 120), (100, "x" * 120)]
+    results = [
+        [{"text": "Sarah Ch", "label": "person", "start": 110, "end": 118, "score": 0.7}],  # cut at the edge
+        [{"text": "Sarah Chen", "label": "person", "start": 10, "end": 20, "score": 0.9},
+         {"text": "Sarah Chen", "label": "organization", "start": 10, "end": 20, "score": 0.4}],
+    ]
+    out = merge_window_entities(windows, results)
+    assert [(e["label"], e["start"], e["end"]) for e in out] == [("person", 110, 120), ("organization", 110, 120)]
+
+
+def test_same_as_pairwise_random():
+    rng = random.Random(11)
+    for _ in range(300):
+        windows = [(i * 80, "") for i in range(rng.randint(2, 5))]
+        results = []
+        for _ in windows:
+            entities = []
+            for _ in range(rng.randint(0, 12)):
+                start = rng.randint(0, 100)
+                entities.append({"text": "", "label": rng.choice(["person", "location", "email"]),
+                                 "start": start, "end": start + rng.randint(0, 15),
+                                 "score": rng.choice([0.5, 0.7, 0.9])})
+            results.append(entities)
+        assert merge_window_entities(windows, results) == legacy_merge(windows, results)
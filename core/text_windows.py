@@ -0,0 +1,124 @@
+"""
+text_windows.py - splits long text into overlapping windows for NER
+
+GLiNER only sees ~384 words at a time and silently drops the rest,
+so long docs (contracts, discharge summaries) get cut into windows on
+sentence boundaries, run as one batch, and the entities get mapped
+back onto the original text.
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+
+
+# ~1200 chars stays under GLiNER's 384 word limit even with lots of punctuation
+WINDOW_CHARS = 1200
+WINDOW_OVERLAP = 200
+
+# end of sentence = . ! ? (plus closing quotes/brackets) then whitespace, or a blank line
+_SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+|\n\s*\n')
+
+# "Dr. Sarah Chen" is not two sentences
+_ABBREVIATIONS = {
+    "dr", "mr", "mrs", "ms", "prof", "st", "jr", "sr", "vs",
+    "inc", "ltd", "co", "corp", "no", "etc", "e.g", "i.e", "adv",
+}
+
+
+def sentence_starts(text: str) -> list[int]:
+    """offsets where each sentence begins (always includes 0)"""
+    starts = [0]
+    for m in _SENTENCE_END.finditer(text):
+        if m.end() >= len(text):
+            break
+        if not m.group().startswith("\n"):
+            word = text[:m.start()].rsplit(None, 1)
+            if word and word[-1].lower().lstrip("(\"'") in _ABBREVIATIONS:
+                continue
+        starts.append(m.end())
+    return starts
+
+
+def split_sentences(text: str) -> list[tuple[int, str]]:
+    """split into (offset, sentence) pairs, sentences keep their trailing whitespace"""
+    starts = sentence_starts(text)
+    ends = starts[1:] + [len(text)]
+    return [(s, text[s:e]) for s, e in zip(starts, ends) if s < e]
+
+
+def make_windows(text: str, max_chars: int = WINDOW_CHARS, overlap: int = WINDOW_OVERLAP) -> list[tuple[int, str]]:
+    """
+    cut text into (offset, window) pairs of at most max_chars.
+    windows end on a sentence boundary when one fits, otherwise on a space,
+    and each window starts up to `overlap` chars before the previous one ended
+    so entities sitting on a boundary are seen whole at least once
+    """
+    if len(text) <= max_chars:
+        return [(0, text)]
+
+    cuts = sentence_starts(text)
+    windows = []
+    start = 0
+
+    while True:
+        limit = start + max_chars
+        if limit >= len(text):
+            windows.append((start, text[start:]))
+            break
+
+        # last sentence start that still fits in this window
+        end = cuts[bisect_right(cuts, limit) - 1]
+        if end <= start:
+            # one giant sentence, fall back to a word boundary
+            end = text.rfind(" ", start + 1, limit) + 1
+            if end <= start + 1:
+                end = limit
+        windows.append((start, text[start:end]))
+
+        # next window backs up into the overlap, preferably to a sentence start
+        i = bisect_left(cuts, end - overlap)
+        if i < len(cuts) and start < cuts[i] < end:
+            next_start = cuts[i]
+        else:
+            space = text.find(" ", max(end - overlap, start + 1), end)
+            next_start = space + 1 if space != -1 else end
+        start = next_start
+
+    return windows
+
+
+def merge_window_entities(windows: list[tuple[int, str]], results: list[list[dict]]) -> list[dict]:
+    """
+    shift each window's entities back to original offsets and drop the
+    duplicates the overlaps produce. same-label spans that overlap are
+    the same entity seen twice (or cut off at a window edge) - keep the
+    longest, ties go to the higher score
+    """
+    shifted = []
+    for (offset, _), entities in zip(windows, results):
+        for e in entities:
+            e = dict(e)
+            e["start"] += offset
+            e["end"] += offset
+            shifted.append(e)
+
+    if len(windows) == 1:
+        return shifted
+
+    shifted.sort(key=lambda e: (e["end"] - e["start"], e.get("score", 0)), reverse=True)
+    # kept spans of one label never overlap each other, so per label they're
+    # sorted [start, end) intervals and "overlaps a kept one?" is a bisect,
+    # not a look at every kept entity
+    taken = {}  # label -> (starts, ends)
+    kept = []
+    for e in shifted:
+        starts, ends = taken.setdefault(e["label"], ([], []))
+        i = bisect_right(ends, e["start"])  # first kept span ending after e starts
+        if i < len(starts) and starts[i] < e["end"]:
+            continue
+        starts.insert(i, e["start"])
+        ends.insert(i, e["end"])
+        kept.append(e)
+
+    kept.sort(key=lambda e: e["start"])
+    return kept